@@ -6,7 +6,7 @@ import result_visualisation as re_vis
 
 import matplotlib.pyplot as plt
 
-corpus_novels = dc.Corpus("../exemplar_texts/novels_poems")
+corpus_novels = dc.Corpus("../exemplar_texts/novels_poems", cache_dir="../.token_cache")
 
 # Basic corpus analysis:
 # Number of distinct tokens, number of word count, number of texts, text names
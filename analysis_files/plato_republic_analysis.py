@@ -6,7 +6,7 @@ import result_visualisation as re_vis
 
 import matplotlib.pyplot as plt
 
-plato_corpus = dc.Corpus('../exemplar_texts/plato_republic')
+plato_corpus = dc.Corpus('../exemplar_texts/plato_republic', cache_dir='../.token_cache')
 
 # Basic corpus analysis:
 # Number of distinct tokens, number of word count, number of texts - OK
@@ -33,7 +33,10 @@ plato_tf_idf = comp_a.get_tf_idf_batch(plato_rand_toks, plato_corpus)
 plato_td_idf_fig = comp_a.plot_tf_idf_matrix(plato_tf_idf)
 plt.show()
 
-# Find term with highest TD-IDF for each text and show them - LEFT
+# Find term with highest TD-IDF for each text and show them - OK
+plato_top_terms = comp_a.get_top_tf_idf_terms(plato_corpus, k=5)
+for book, top_terms in plato_top_terms.items():
+    print(book, list(top_terms.index))
 
 # Specific analysis:
 # Changes of most common words across different books - line plot - OK [justice, glaucon, division]
@@ -6,7 +6,7 @@ import result_visualisation as re_vis
 
 import matplotlib.pyplot as plt
 
-corpus_science = dc.Corpus("../exemplar_texts/pop_science")
+corpus_science = dc.Corpus("../exemplar_texts/pop_science", cache_dir="../.token_cache")
 
 # Basic corpus analysis:
 # Number of distinct tokens, number of word count, number of texts, text names
@@ -6,7 +6,7 @@ import result_visualisation as re_vis
 
 import matplotlib.pyplot as plt
 
-corpus_the_times = dc.Corpus("../exemplar_texts/the_times")
+corpus_the_times = dc.Corpus("../exemplar_texts/the_times", cache_dir="../.token_cache")
 
 # Basic corpus analysis:
 # Number of distinct tokens, number of word count, number of texts, text names
@@ -6,7 +6,7 @@ import result_visualisation as re_vis
 
 import matplotlib.pyplot as plt
 
-corpus_wiki = dc.Corpus("../exemplar_texts/wikipedia_articles")
+corpus_wiki = dc.Corpus("../exemplar_texts/wikipedia_articles", cache_dir="../.token_cache")
 
 # Basic corpus analysis:
 # Number of distinct tokens, number of word count, number of texts, text names
@@ -0,0 +1,41 @@
+import os
+import sys
+import statistics
+import subprocess
+
+'''
+Measures time of importing modules of the project in fresh interpreter processes (as CLI invocation or process pool
+worker would do). Each module is imported in a separate process several times and median is reported.
+Usage: python benchmarks/bench_import.py [n_repeats]
+'''
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['tokenedtext_class', 'corpus_class', 'freq_analysis', 'comp_analysis', 'result_visualisation']
+
+# Prints time of importing the module (in seconds), measured within child interpreter
+_SNIPPET = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def time_import(module: str, n_repeats=5):
+    """
+    Imports module in n_repeats fresh interpreters.
+    :param module: (str) Name of the module.
+    :param n_repeats: (int) Number of measurements.
+    :return: (float) Median import time in milliseconds.
+    """
+    times = []
+    for _ in range(n_repeats):
+        out = subprocess.run([sys.executable, '-c', _SNIPPET.format(module=module)], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(times)
+
+
+def main(n_repeats=5):
+    print(f"{'Module:'.ljust(22)} {'Import [ms]:'.rjust(12)}")
+    for module in MODULES:
+        print(f"{module.ljust(22)} {time_import(module, n_repeats):12.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
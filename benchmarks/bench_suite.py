@@ -0,0 +1,269 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+
+import matplotlib
+matplotlib.use('Agg')  # benchmarks never open windows
+import matplotlib.pyplot as plt
+import numpy as np
+
+import tokenedtext_class as tkn
+import corpus_class as corp
+import freq_analysis as freq_a
+import comp_analysis as comp_a
+import result_visualisation as res_v
+
+'''
+Benchmark suite of the whole pipeline: TokenedText construction, Corpus building, cosine similarity matrix, TF-IDF
+and plotting functions. Stages run on exemplar_texts corpora and on synthetic corpora made by replicating files of
+a base corpus (more documents) and by replicating them with altered words (larger vocabulary as well).
+Wall time, peak memory (tracemalloc, separate run) and throughput (tokens/s) of every stage are written as JSON.
+With --compare, results are checked against saved baseline and exit code is 1 if any stage got slower or bigger than
+allowed by --tolerance.
+Usage: python benchmarks/bench_suite.py [--output results.json] [--compare baseline.json] [--replicate 10 100] ...
+'''
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXTS_PATH = os.path.join(REPO_ROOT, 'exemplar_texts')
+STAGES = ('tokenize', 'corpus', 'cos_similarity', 'tf_idf_batch', 'plot_bar', 'plot_word_cloud', 'plot_heatmap',
+          'plot_tf_idf', 'plot_trend')
+# Stages which have to run before the given one, as they create its input
+DEPENDENCIES = {'cos_similarity': ('corpus',), 'tf_idf_batch': ('corpus',), 'plot_bar': ('corpus',),
+                'plot_word_cloud': ('corpus',), 'plot_heatmap': ('corpus', 'cos_similarity'),
+                'plot_tf_idf': ('corpus', 'tf_idf_batch'), 'plot_trend': ('corpus',)}
+SEED = 0  # synthetic corpora and sampled terms are the same in every run
+PLOT_DOCS = 50  # heatmaps draw only the first documents, annotated cells of large corpora would dominate the run
+
+
+def make_synthetic(src_folder: str, dst_folder: str, n_copies: int, grow_vocab=False):
+    """
+    Creates synthetic corpus by replicating every *.txt file of source folder n_copies times.
+    :param src_folder: (str) Path to folder with *.txt files.
+    :param dst_folder: (str) Path to folder of synthetic corpus, created if it does not exist.
+    :param n_copies: (int) Number of copies of every file.
+    :param grow_vocab: (bool) If True, every copy alters half of its words with letters unique to the copy,
+        so vocabulary grows with number of copies. Otherwise copies are identical to the source.
+    :return: (str) dst_folder
+    """
+    os.makedirs(dst_folder, exist_ok=True)
+    rng = np.random.default_rng(SEED)
+    for file_name in sorted(os.listdir(src_folder)):
+        if not file_name.endswith('.txt'):
+            continue
+        content = tkn.TokenedText.load_txt(os.path.join(src_folder, file_name))
+        words = content.split()
+        for copy in range(n_copies):
+            if grow_vocab:
+                suffix = ''.join(chr(ord('a') + int(d)) for d in str(copy))  # letters only, kept by clean_char()
+                altered = rng.random(len(words)) < 0.5
+                text = ' '.join(wrd + suffix if alt else wrd for wrd, alt in zip(words, altered.tolist()))
+            else:
+                text = content
+            # Copy number ends the name, so it becomes 'period' metadata of the text
+            with open(os.path.join(dst_folder, f'{file_name[:-4]}_c{copy:04d}.txt'), 'w', encoding='utf-8') as file:
+                file.write(text)
+    return dst_folder
+
+
+def _stage_functions(folder_path: str, tokenizer: str, plot_docs=PLOT_DOCS):
+    """
+    Prepares stages of the pipeline for single corpus. Each stage is a function without arguments, which may use
+    state created by stages it depends on (see DEPENDENCIES).
+    :param folder_path: (str) Path to folder with *.txt files.
+    :param tokenizer: (str) Tokenizer backend, one of tokenedtext_class.TOKENIZERS.
+    :param plot_docs: (int) Number of first documents drawn by heatmap stages, so their cost does not grow with corpus.
+    :return functions: (dict) Stage names (str) as keys and functions as values.
+    :return state: (dict) State shared by the stages, 'size' holds numbers of documents and tokens of the corpus.
+    """
+    state = {}
+
+    def tokenize():
+        txt_names = sorted(name for name in os.listdir(folder_path) if name.endswith('.txt'))
+        tok_txts = [tkn.TokenedText(os.path.join(folder_path, name), name, tokenizer=tokenizer, keep_tokens=False)
+                    for name in txt_names]
+        state['size'] = {'n_docs': len(tok_txts), 'n_tokens': sum(tok_txt.n_words for tok_txt in tok_txts)}
+
+    def corpus():
+        state['corpus'] = corp.Corpus(folder_path, tokenizer=tokenizer)
+        state['terms'] = state['corpus'].get_random_tokens(50, seed=SEED)
+        state['size'] = {'n_docs': state['corpus'].n_txt, 'n_tokens': state['corpus'].n_words,
+                         'n_terms': len(state['corpus'].tokens)}
+
+    def cos_similarity():
+        state['corpus']._csim = None  # always computed from scratch, not taken from Corpus cache
+        state['csim'] = state['corpus'].cos_similarity_matrix()
+
+    def tf_idf_batch():
+        state['tf_idf'] = comp_a.get_tf_idf_batch(state['terms'], state['corpus'])
+
+    def plot_trend():
+        terms = list(state['corpus'].most_common(3))
+        return res_v.change_over_time(state['corpus'], terms)
+
+    return {'tokenize': tokenize,
+            'corpus': corpus,
+            'cos_similarity': cos_similarity,
+            'tf_idf_batch': tf_idf_batch,
+            'plot_bar': lambda: freq_a.create_bar_count(state['corpus'], 25),
+            'plot_word_cloud': lambda: freq_a.create_word_cloud(state['corpus']),
+            'plot_heatmap': lambda: comp_a.plot_cos_similarity_heatmap(state['csim'].iloc[:plot_docs, :plot_docs]),
+            'plot_tf_idf': lambda: comp_a.plot_tf_idf_matrix(state['tf_idf'].iloc[:10, :plot_docs]),
+            'plot_trend': plot_trend}, state
+
+
+def _run_stage(func, measure_memory: bool):
+    """
+    Runs single stage, with its terminal output suppressed and created figures closed.
+    :param func: (function) Stage.
+    :param measure_memory: (bool) If True, stage runs under tracemalloc, so its time is not reported.
+    :return: (float) Wall time in seconds, or peak memory in MB when measure_memory is True.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        if measure_memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result = peak / 2 ** 20
+        else:
+            start = time.perf_counter()
+            func()
+            result = time.perf_counter() - start
+    plt.close('all')
+    return result
+
+
+def bench_corpus(label: str, folder_path: str, stages, tokenizer='fast', repeats=1, measure_memory=True,
+                 plot_docs=PLOT_DOCS):
+    """
+    Benchmarks stages of the pipeline on single corpus.
+    :param label: (str) Name of the corpus within results.
+    :param folder_path: (str) Path to folder with *.txt files.
+    :param stages: (list) Names of stages (str) to run, from STAGES.
+    :param tokenizer: (str) Tokenizer backend.
+    :param repeats: (int) Number of timed runs of every stage, the best one is reported.
+    :param measure_memory: (bool) If True, every stage is run once more under tracemalloc for its peak memory.
+    :param plot_docs: (int) Number of first documents drawn by heatmap stages.
+    :return: (list) of (dict) results, one per stage.
+    """
+    # Stages which create input of requested ones are run as well, but not reported
+    needed = set(stages).union(*(DEPENDENCIES.get(stage, ()) for stage in stages))
+    needed = [stage for stage in STAGES if stage in needed]
+    functions, state = _stage_functions(folder_path, tokenizer, plot_docs)
+    results = []
+    for stage in needed:
+        wall = min(_run_stage(functions[stage], False) for _ in range(repeats))
+        if stage not in stages:
+            continue
+        peak = _run_stage(functions[stage], True) if measure_memory else None
+
+        n_tokens = state['size']['n_tokens']
+        results.append(dict({'corpus': label, 'stage': stage}, **state['size'], wall_s=round(wall, 6),
+                            peak_mb=None if peak is None else round(peak, 3),
+                            tokens_per_s=round(n_tokens / wall, 1) if wall > 0 else None))
+        print(f"{label.ljust(32)} {stage.ljust(16)} {wall:10.3f} "
+              f"{'-' if peak is None else f'{peak:.1f}':>10} {n_tokens / max(wall, 1e-9):14.0f}")
+    return results
+
+
+def compare(results, baseline, tolerance: float):
+    """
+    Compares results with baseline stage by stage.
+    :param results: (list) of (dict) results of this run.
+    :param baseline: (list) of (dict) results of baseline run.
+    :param tolerance: (float) Allowed relative increase of wall time and peak memory, e.g. 0.2 for 20%.
+    :return: (list) of (str) descriptions of regressions, empty if there are none.
+    """
+    base = {(res['corpus'], res['stage']): res for res in baseline}
+    regressions = []
+    print(f"\n{'Corpus:'.ljust(32)} {'Stage:'.ljust(16)} {'Time ratio:'.rjust(11)} {'Memory ratio:'.rjust(13)}")
+    for res in results:
+        old = base.get((res['corpus'], res['stage']))
+        if old is None:
+            continue
+        ratios = {'wall_s': res['wall_s'] / max(old['wall_s'], 1e-9), 'peak_mb': None}
+        if res['peak_mb'] is not None and old['peak_mb'] is not None:
+            ratios['peak_mb'] = res['peak_mb'] / max(old['peak_mb'], 1e-9)
+        print(f"{res['corpus'].ljust(32)} {res['stage'].ljust(16)} {ratios['wall_s']:10.2f}x "
+              f"{'-' if ratios['peak_mb'] is None else format(ratios['peak_mb'], '.2f') + 'x':>13}")
+        for metric, ratio in ratios.items():
+            if ratio is not None and ratio > 1 + tolerance:
+                regressions.append(f"{res['corpus']} / {res['stage']}: {metric} {old[metric]} -> {res[metric]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite of the text analysis pipeline.')
+    parser.add_argument('--corpora', nargs='*', default=None,
+                        help='exemplar_texts corpora to run (default: all)')
+    parser.add_argument('--base-corpus', default='plato_republic', help='corpus replicated into synthetic ones')
+    parser.add_argument('--replicate', nargs='*', type=int, default=[10, 100],
+                        help='numbers of copies of base corpus files (more documents)')
+    parser.add_argument('--grow-vocab', nargs='*', type=int, default=[10],
+                        help='numbers of copies of base corpus files with altered words (larger vocabulary)')
+    parser.add_argument('--stages', nargs='*', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--tokenizer', default='fast', choices=tkn.TOKENIZERS)
+    parser.add_argument('--repeats', type=int, default=1, help='timed runs of every stage, the best is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurement')
+    parser.add_argument('--plot-docs', type=int, default=PLOT_DOCS,
+                        help=f'documents drawn by heatmap stages (default: {PLOT_DOCS})')
+    parser.add_argument('--output', default=None, help='path to JSON file with results')
+    parser.add_argument('--compare', default=None, help='path to JSON file with baseline results')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    corpora = args.corpora if args.corpora is not None else sorted(
+        name for name in os.listdir(TEXTS_PATH) if os.path.isdir(os.path.join(TEXTS_PATH, name)))
+    bench_kwargs = {'stages': args.stages, 'tokenizer': args.tokenizer, 'repeats': args.repeats,
+                    'measure_memory': not args.no_memory, 'plot_docs': args.plot_docs}
+
+    tkn.default_filter()  # stop-words are loaded once, before any stage is timed
+    print(f"{'Corpus:'.ljust(32)} {'Stage:'.ljust(16)} {'Time [s]:'.rjust(10)} {'Peak [MB]:'.rjust(10)} "
+          f"{'Tokens/s:'.rjust(14)}")
+    results = []
+    for name in corpora:
+        results += bench_corpus(name, os.path.join(TEXTS_PATH, name), **bench_kwargs)
+
+    # Synthetic corpora live in temporary folder only for the time of the run
+    tmp_dir = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        src_folder = os.path.join(TEXTS_PATH, args.base_corpus)
+        for n_copies, grow_vocab in [(n, False) for n in args.replicate] + [(n, True) for n in args.grow_vocab]:
+            label = f"{args.base_corpus}_x{n_copies}{'_vocab' if grow_vocab else ''}"
+            folder_path = make_synthetic(src_folder, os.path.join(tmp_dir, label), n_copies, grow_vocab)
+            results += bench_corpus(label, folder_path, **bench_kwargs)
+            shutil.rmtree(folder_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                       'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'settings': vars(args)},
+              'results': results}
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            return 1
+        print('\nNo regressions.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
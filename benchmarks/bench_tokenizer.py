@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+
+import tokenedtext_class as tkn
+
+'''
+Compares 'nltk' and 'fast' tokenizer backends of TokenedText on all exemplar_texts corpora.
+Checks token-for-token parity of both backends on every file and reports time spent on tokenization.
+Usage: python benchmarks/bench_tokenizer.py [path_to_texts_folder]
+'''
+
+
+def bench_folder(folder_path: str):
+    """
+    Tokenizes every *.txt file in folder with both backends.
+    :param folder_path: (str) Path to folder with *.txt files.
+    :return: (tuple) of time of 'nltk' backend (float), time of 'fast' backend (float), number of tokens (int),
+        list of files (str) for which backends disagree.
+    """
+    t_nltk, t_fast, n_tokens, mismatches = 0.0, 0.0, 0, []
+    for file_name in sorted(os.listdir(folder_path)):
+        if not file_name.endswith('.txt'):
+            continue
+        content = tkn.TokenedText.clean_char(tkn.TokenedText.load_txt(os.path.join(folder_path, file_name)))
+
+        start = time.perf_counter()
+        toks_nltk = tkn.TokenedText.tokenize(content, 'nltk')
+        t_nltk += time.perf_counter() - start
+
+        start = time.perf_counter()
+        toks_fast = tkn.TokenedText.tokenize(content, 'fast')
+        t_fast += time.perf_counter() - start
+
+        n_tokens += len(toks_nltk)
+        if toks_nltk != toks_fast:
+            mismatches.append(file_name)
+    return t_nltk, t_fast, n_tokens, mismatches
+
+
+def main(texts_path: str):
+    print(f"{'Corpus:'.ljust(20)} {'Tokens:'.rjust(10)} {'nltk [s]:'.rjust(10)} {'fast [s]:'.rjust(10)} "
+          f"{'Speedup:'.rjust(9)}  Parity:")
+    all_ok = True
+    for corpus_name in sorted(os.listdir(texts_path)):
+        folder_path = os.path.join(texts_path, corpus_name)
+        if not os.path.isdir(folder_path):
+            continue
+        t_nltk, t_fast, n_tokens, mismatches = bench_folder(folder_path)
+        all_ok &= not mismatches
+        parity = 'OK' if not mismatches else f"MISMATCH in {', '.join(mismatches)}"
+        print(f"{corpus_name.ljust(20)} {str(n_tokens).rjust(10)} {t_nltk:10.3f} {t_fast:10.3f} "
+              f"{t_nltk / max(t_fast, 1e-9):8.1f}x  {parity}")
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'exemplar_texts')
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else default_path))
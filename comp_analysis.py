@@ -6,11 +6,14 @@ import matplotlib.pyplot as plt
 import tokenedtext_class as tkn
 import corpus_class as corp
 import freq_analysis as freq_a
+from docterm_class import DocTermMatrix
 
 '''
 This file contains functions for comparative analysis between many tokened objects or within Corpus.
 It also contains function allowing for plotting results of these analyses.
 Functions:
+    - get_tf_idf_matrix()
+    - get_top_tf_idf_terms()
     - get_tf_idf_batch()
     - plot_tf_idf_matrix()
     - cosine_similarity()
@@ -18,75 +21,116 @@ Functions:
 '''
 
 
-def get_tf_idf_batch(term_list, obj_tok):
+def _get_doc_term_matrix(obj_tok):
     """
-    Computes TF-IDF for a list of terms and either a list of TokenedText objects or a Corpus object,
-    return matrix of TF-IDF values as DataFrame.
-    :param term_list: (list) List of terms (str) to calculate TF-IDF for.
-    :param obj_tok: (Corpus) or (list) of (TokenedText),
-    :return: tf_idf_df (DataFrame) of TF-IDF values, where rows are terms and columns are different texts.
+    Helper function returning document-term count matrix of either a list of TokenedText objects or a Corpus object.
+    :param obj_tok: (Corpus) or (list) of (TokenedText)
+    :return dtm: (DocTermMatrix) Counts matrix, rows are texts.
+    :return doc_list: (list) Names of texts (str), in the order of dtm rows.
     """
-
-    # Different handling of list of TokenedTexts or Corpus.
     if isinstance(obj_tok, list):  # If we got list of TokenedText
         # Validate that obj_tok is a list of TokenedText objects
         for obj in obj_tok:
             if not isinstance(obj, tkn.TokenedText):
                 raise TypeError('obj_tok must be of type list of TokenedText or Corpus')
+        _check_same_ngram(obj_tok)
+        dtm = DocTermMatrix.from_arrays([tok_txt.terms for tok_txt in obj_tok],
+                                        [tok_txt.term_counts for tok_txt in obj_tok],
+                                        [tok_txt.n_words for tok_txt in obj_tok])  # rows may hold only kept terms
+        return dtm, [tok_txt.name for tok_txt in obj_tok]
+
+    elif isinstance(obj_tok, corp.Corpus):  # If we got Corpus, its matrix is already there
+        return obj_tok.dtm, obj_tok.txt_names
+
+    raise TypeError('obj_tok must be of type list of TokenedText or Corpus')
+
+
+def _check_same_ngram(tok_txts):
+    """
+    Helper function making sure that texts are compared on terms of the same kind (words, bigrams...).
+    :param tok_txts: (list) of (TokenedText)
+    """
+    ngrams = sorted({tok_txt.ngram for tok_txt in tok_txts})
+    if len(ngrams) > 1:
+        raise ValueError(f"Texts with different n-gram sizes cannot be compared. Got: ngram values {ngrams}")
+
 
-        # Create DataFrame for term counts from nested dictionary
-        doc_list = [tok_txt.name for tok_txt in obj_tok]  # Names of files, for column labels
-        # term_counts = {<doc_name> : {<term> : <count of term>}}
-        term_counts = {doc: {
-            term: tok_txt.counts.get(term, 0) for term in term_list  # if no term is found, then count = 0
-        } for doc, tok_txt in zip(doc_list, obj_tok)}
+def get_tf_idf_matrix(obj_tok):
+    """
+    Computes TF-IDF for every term of the vocabulary and every text in a single vectorized pass.
+    :param obj_tok: (Corpus) or (list) of (TokenedText)
+    :return tf_idf: (DocTermMatrix) Sparse TF-IDF matrix - same layout and vocabulary as the counts matrix, but data
+        holds TF-IDF values (float). Terms absent from a text have TF-IDF equal to 0.
+    :return doc_list: (list) Names of texts (str), in the order of matrix rows.
+    """
+    dtm, doc_list = _get_doc_term_matrix(obj_tok)
 
-        term_df = pd.DataFrame(term_counts).fillna(0)  # If any matrix cell is missing, fill it with 0.
+    # TF is count / number of words within the text (kept by dtm for every text), IDF is log(n_txt / df) and
+    # every term of vocabulary occurs in at least one text. Both are computed only for non-zero cells.
+    return dtm.tf_idf(), doc_list
 
-        # Total word counts for each document - pandas Series dataframe
-        n_words = pd.Series({doc: tok_txt.n_words for doc, tok_txt in zip(doc_list, obj_tok)})
 
-    elif isinstance(obj_tok, corp.Corpus):  # If we got Corpus
-        doc_list = obj_tok.txt_names  # Names of files, for column labels
-        # Same as above, but now by accessing corpus texts
-        term_counts = {doc: {
-            term: obj_tok.corpus_txts[doc].counts.get(term, 0) for term in term_list
-        } for doc in doc_list}
+def get_top_tf_idf_terms(obj_tok, k=10):
+    """
+    Finds k terms with the highest TF-IDF within every text, i.e. terms most characteristic for that text.
+    :param obj_tok: (Corpus) or (list) of (TokenedText)
+    :param k: (int) Number of terms per text.
+    :return: (dict) Names of texts (str) as keys and (Series) of TF-IDF values indexed by terms as values,
+        sorted from the highest TF-IDF.
+    """
+    tf_idf, doc_list = get_tf_idf_matrix(obj_tok)
+    rows = tf_idf.row_ids()
 
-        term_df = pd.DataFrame(term_counts).fillna(0)
+    # Sort all cells by text and then by descending TF-IDF, and keep k first cells of every text
+    order = np.lexsort((-tf_idf.data, rows))
+    rank = np.arange(len(order)) - tf_idf.indptr[rows[order]]  # position of the cell within its text
+    top = order[rank < k]
+    bounds = np.searchsorted(rows[top], np.arange(len(doc_list) + 1))  # kept cells are still grouped by text
 
-        # Total word counts for each document
-        n_words = pd.Series(obj_tok.n_words, index=doc_list)
+    top_terms = {}
+    for i, doc in enumerate(doc_list):
+        cells = top[bounds[i]:bounds[i + 1]]
+        top_terms[doc] = pd.Series(tf_idf.data[cells], index=[tf_idf.vocab[t] for t in tf_idf.indices[cells]])
+    return top_terms
 
-    else:
-        raise TypeError('obj_tok must be of type list of TokenedText or Corpus')
 
-    # Now we got :
-    # term_df with shape (n_terms, n_files) where we got counts for individual terms
-    # n_words with shape (n_files, ) where we got total num of words in individual texts
+def get_tf_idf_batch(term_list, obj_tok):
+    """
+    Computes TF-IDF for a list of terms and either a list of TokenedText objects or a Corpus object,
+    return matrix of TF-IDF values as DataFrame. It is a slice of get_tf_idf_matrix() result.
+    :param term_list: (list) List of terms (str) to calculate TF-IDF for.
+    :param obj_tok: (Corpus) or (list) of (TokenedText),
+    :return: tf_idf_df (DataFrame) of TF-IDF values, where rows are terms and columns are different texts.
+        Terms which do not occur in any text have NaN values.
+    """
+    tf_idf, doc_list = get_tf_idf_matrix(obj_tok)
 
-    # Calculate term frequencies (TF): tf = term_df / n_words
-    tfs = term_df.div(n_words, axis=1)
+    # Position of every vocabulary term within term_list (-1 for terms which were not asked for)
+    term_ids = np.array([tf_idf.vocab_ids.get(term, -1) for term in term_list], dtype=np.int64)
+    found = term_ids >= 0
+    term_pos = np.full(tf_idf.n_terms, -1, dtype=np.int64)
+    term_pos[term_ids[found]] = np.arange(len(term_list))[found]
 
-    # Calculate document frequencies (DF): In how many documents specific term has occurred
-    df = (term_df > 0).sum(axis=1)
+    # Scatter cells of asked terms into dense <n_terms x n_files> matrix
+    tf_idf_vals = np.zeros((len(term_list), len(doc_list)), dtype=np.float64)
+    pos = term_pos[tf_idf.indices]
+    cells = pos >= 0
+    tf_idf_vals[pos[cells], tf_idf.row_ids()[cells]] = tf_idf.data[cells]
 
-    # Calculate inverse document frequencies (IDF)
-    n_txt = len(doc_list)
-    idf = pd.Series(index=term_list, dtype=float)  # predefine pd.Series for storing IDFs
-    idf[df > 0] = np.log(n_txt / df[df > 0])  # For terms which occured at least once within collection of texts
-    idf[df == 0] = -np.inf  # Assign -inf for terms that don't appear in any text
+    # Duplicated terms get filled only once above, so copy their rows; unknown terms are NaN (IDF = -inf, TF = 0)
+    tf_idf_vals[found] = tf_idf_vals[term_pos[term_ids[found]]]
+    tf_idf_vals[~found] = np.nan
 
-    # Calculate TF-IDF : tf-idf = tf * idf
-    tf_idf_df = tfs.multiply(idf, axis=0)
+    tf_idf_df = pd.DataFrame(tf_idf_vals, index=term_list, columns=doc_list)
     return tf_idf_df
 
 
-def plot_tf_idf_matrix(tf_idf_df):
+def plot_tf_idf_matrix(tf_idf_df, fig=None):
     """
     Plots a heatmap of TF-IDF values based on TF-IDF matrix returned from get_tf_idf_batch().
     :param tf_idf_df: (DataFrame) TF-IDF matrix with rows and columns labels.
-    :return:
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
+    :return: (Figure) Plotted heatmap.
     """
     # Extract values for the heatmap
     tf_idf_matrix = tf_idf_df.values
@@ -95,7 +139,7 @@ def plot_tf_idf_matrix(tf_idf_df):
     mask_nan_vals = np.isnan(tf_idf_matrix)  # Creating mask for NaN values within the matrix
 
     # Create the heatmap
-    fig, ax = plt.subplots(figsize=(12, 10))
+    fig, ax = freq_a.subplots((12, 10), fig)
     sns.heatmap(  # using Seaborn heatmap
         tf_idf_matrix,
         xticklabels=doc_list,
@@ -124,9 +168,9 @@ def plot_tf_idf_matrix(tf_idf_df):
     ax.set_xlabel("Documents", fontsize=12)
     ax.set_ylabel("Terms", fontsize=12)
     ax.set_title("TF-IDF Heatmap", fontsize=14)
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-    plt.tight_layout()
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')  # on ax itself, which may not be the current pyplot one
+    plt.setp(ax.get_yticklabels(), rotation=0)
+    fig.tight_layout()
 
     return fig
 
@@ -138,6 +182,8 @@ def cosine_similarity(toktxt_a: tkn.TokenedText, toktxt_b: tkn.TokenedText):
     :param toktxt_b: (TokenedText)
     :return: (float) Cosine similarity between toktxt_a and toktxt_b
     """
+    _check_same_ngram([toktxt_a, toktxt_b])
+
     # Access counts dictionaries
     cnt_a = toktxt_a.counts
     cnt_b = toktxt_b.counts
@@ -162,16 +208,17 @@ def cosine_similarity(toktxt_a: tkn.TokenedText, toktxt_b: tkn.TokenedText):
     return dot_prod / (abs_a * abs_b)  # calculated cosine similarity
 
 
-def plot_cos_similarity_heatmap(csim_df):
+def plot_cos_similarity_heatmap(csim_df, fig=None):
     """
     Plots a heatmap of cosine similarity based on matrix returned from cos_similarity_matrix() method
     in Corpus class.
     :param csim_df: (DataFrame) Cosine similarity matrix with labeled rows and columns.
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
     :return: (Figure) Plotted heatmap.
     """
 
     # Creating heatmap
-    fig, ax = plt.subplots(figsize=(10, 8))
+    fig, ax = freq_a.subplots((10, 8), fig)
     sns.heatmap(
         csim_df,
         annot=True,  # Show values in cells
@@ -186,8 +233,8 @@ def plot_cos_similarity_heatmap(csim_df):
     ax.set_xlabel("Texts", fontsize=12)
     ax.set_ylabel("Texts", fontsize=12)
     ax.set_title("Cosine Similarity Heatmap", fontsize=14)
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-    plt.tight_layout()
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    plt.setp(ax.get_yticklabels(), rotation=0)
+    fig.tight_layout()
 
     return fig
@@ -1,15 +1,92 @@
 import os
+import json
 import random
+from collections.abc import MutableMapping
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
 import tokenedtext_class as tkn
-import comp_analysis as comp_a
+from profiler import NULL_PROFILER, Profiler
+from docterm_class import DocTermMatrix, concat_ranges, save_array, top_ids
+from simindex_class import SimilarityIndex
+from minhash_class import MinHasher, LSHIndex
+from sketch_class import Sketcher, FrequencySketch
+from ngram_count import default_min_count
 
 # TODO: DONE
 '''
 This file defines Corpus class, which will be default object used for interfile comparative analysis.
 '''
 
+# Default metadata of texts parsed from *.txt file names - number ending the name, e.g. year or book
+DEFAULT_METADATA_PATTERN = r'(?P<period>\d+)\.txt$'
+
+SAVE_VERSION = 1  # bump when layout written by Corpus.save() changes
+CSIM_TILE_CELLS = 1 << 22  # similarities per tile of cos_similarity_matrix(), 32 MB
+
+
+def _profiled_tokened_text(txt_path: str, name: str, **tok_params):
+    """
+    Creates TokenedText in worker process with its own Profiler, so events recorded there can be sent back.
+    :param txt_path: (str) Path to *.txt file.
+    :param name: (str) Name of the text.
+    :param tok_params: Other arguments of TokenedText.
+    :return: (tuple) of TokenedText and events (list) recorded while creating it.
+    """
+    events = []
+    tok_txt = tkn.TokenedText(txt_path, name, profiler=Profiler(sink=events.append), **tok_params)
+    return tok_txt, events
+
+
+def _merge_sketches(tok_txts, sketch):
+    """
+    Merges sketches of texts into single sketch as the texts are created, and drops them from the texts (which keep
+    their most frequent terms), so memory of sketches does not grow with the number of texts.
+    :param tok_txts: (iterable) TokenedTexts.
+    :param sketch: (FrequencySketch) Sketch of all texts. If None, texts are yielded untouched.
+    :return: (generator) of TokenedTexts.
+    """
+    for tok_txt in tok_txts:
+        if sketch is not None and tok_txt.sketch is not None:
+            sketch.merge(tok_txt.sketch)
+            tok_txt.sketch = None
+        yield tok_txt
+
+
+class _DtmTexts(MutableMapping):
+    """
+    'corpus_txts' of loaded Corpus - TokenedTexts are created from dtm rows only when accessed, so loading does not
+    depend on number of texts. Texts added later are stored as they are.
+    """
+
+    def __init__(self, corpus):
+        self._corpus = corpus
+        self._txts = dict.fromkeys(corpus.txt_names)  # None until the text is accessed
+
+    def __getitem__(self, name):
+        tok_txt = self._txts[name]
+        if tok_txt is None:
+            i = self._corpus.txt_names.index(name)
+            tok_txt = self._txts[name] = tkn.TokenedText.from_counts(self._corpus.dtm.row_counts(i), name,
+                                                                     self._corpus._signatures.get(name),
+                                                                     self._corpus.ngram)
+            tok_txt.n_words = int(self._corpus.dtm.doc_lengths[i])  # row holds only top terms of sketched text
+        return tok_txt
+
+    def __setitem__(self, name, tok_txt):
+        self._txts[name] = tok_txt
+
+    def __delitem__(self, name):
+        del self._txts[name]
+
+    def __iter__(self):
+        return iter(self._txts)
+
+    def __len__(self):
+        return len(self._txts)
+
 
 class Corpus:
     """
@@ -22,23 +99,169 @@ class Corpus:
             <values> (TokenedText) : cleaned and tokenized text content
         n_txt (int) : number of text in the corpus
         txt_names (list) : *.txt file names (str)
-        tokens (list) : unique words occurring in the corpus (str)
-        counts (dict) :
+        dtm (DocTermMatrix) : sparse document-term count matrix, rows follow txt_names, columns follow tokens.
+            It also keeps per-text numbers of words (dtm.doc_lengths) and per-token document frequencies
+            (dtm.doc_freqs) as arrays, used by TF-IDF and other normalizations.
+        tokens (list) : unique words occurring in the corpus (str), derived from dtm vocabulary
+        counts (dict) : derived from dtm on first request, in order of tokens (see most_common() for the top ones)
             <keys> (str) : token within corpus
             <values> (int) : number of token occurrences within the corpus
+        metadata (DataFrame) : metadata of texts (e.g. period), one row per text in txt_names order, one column per
+            metadata field. Parsed once, when texts enter the corpus.
+        ngram (int) : number of successive tokens in every term of the corpus (1 for words, 2 for bigrams...)
     """
-    def __init__(self, folder_path: str):
+    def __init__(self, folder_path: str, workers=None, cache_dir=None, stream=False, tokenizer='nltk',
+                 token_filter=None, metadata_pattern=DEFAULT_METADATA_PATTERN, metadata_file=None, keep_tokens=False,
+                 ngram=1, min_count=None, minhasher=None, sketcher=None, profiler=None):
         """
         The constructor for Corpus class.
         Parameters:
         :param folder_path (str): Path to folder with all *.txt files which will be part of the corpus
+        :param workers (int): Number of processes used for tokenizing the files. If None or 1, files are tokenized
+            one after another in the current process.
+        :param cache_dir (str): Path to token cache directory shared by all texts (see TokenedText). If None, no cache.
+        :param stream (bool): If True, texts are tokenized chunk by chunk and keep only their counts (see TokenedText).
+        :param tokenizer (str): Tokenizer backend used for all texts, 'nltk' or 'fast' (see TokenedText).
+        :param token_filter (TokenFilter): Stop-words and min length filter shared by all texts. Defaults to
+            tokenedtext_class.default_filter().
+        :param metadata_pattern (str): Regular expression applied to *.txt file names, each named group becomes
+            a metadata field. Default extracts 'period' - number ending the file name. If None, names are not parsed.
+        :param metadata_file (str): Path to sidecar *.csv file with 'txt_name' column and one column per metadata
+            field. Its values take precedence over values parsed from file names.
+        :param keep_tokens (bool): If True, texts keep sequences of their tokens (see TokenedText). Corpus needs only
+            counts, so by default tokens are dropped after counting to save memory.
+        :param ngram (int): If larger than 1, texts count n-grams of that many successive tokens (e.g. 2 for bigrams)
+            instead of single tokens, and all analyses of the Corpus work on n-grams (see TokenedText).
+        :param min_count (int): Terms occurring fewer times within a text are dropped from it (see TokenedText).
+            Defaults to 1 for single tokens and ngram_count.NGRAM_MIN_COUNT for n-grams.
+        :param minhasher (MinHasher): If given, MinHash signatures of all texts are computed (and cached with their
+            tokens, see TokenedText), which enables near_duplicates().
+        :param sketcher (Sketcher): If given, texts are counted approximately in fixed memory (see TokenedText) and
+            their sketches are merged into single Corpus sketch as they are created, used by most_common(). Texts and
+            document-term matrix hold only the most frequent terms of every text then.
+        :param profiler (Profiler): Records time of stages of every text (see TokenedText) and of the Corpus itself
+            ('texts', 'merge_vocab', 'metadata'), also for texts added later. None to record nothing.
         """
         self.name = folder_path.split('\\')[-1]  # corpus name is folder name
-        self.corpus_txts, self.n_txt, self.txt_names = self.create_corpus_dict(folder_path)
-        self.tokens = self.corpus_tokenize()
-        self.counts, self.n_words = self.corpus_words_count()
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        token_filter = tkn.default_filter() if token_filter is None else token_filter
+        min_count = default_min_count(ngram, min_count)
+        self._tok_params = {'cache_dir': cache_dir, 'stream': stream, 'tokenizer': tokenizer,
+                            'token_filter': token_filter, 'keep_tokens': keep_tokens, 'ngram': ngram,
+                            'min_count': min_count, 'minhasher': minhasher,
+                            'sketcher': sketcher}  # used for all texts, also added ones
+        self._sketch = sketcher.sketch() if sketcher is not None else None  # sketch of all texts, see sketch
+        with self.profiler.stage('texts'):
+            self.corpus_txts, self.n_txt, self.txt_names = self.create_corpus_dict(
+                folder_path, workers=workers, profiler=self.profiler, sketch=self._sketch, **self._tok_params)
+        with self.profiler.stage('merge_vocab'):
+            tok_txts = [self.corpus_txts[name] for name in self.txt_names]
+            self.dtm = DocTermMatrix.from_arrays([tok_txt.terms for tok_txt in tok_txts],
+                                                 [tok_txt.term_counts for tok_txt in tok_txts],
+                                                 [tok_txt.n_words for tok_txt in tok_txts])
+            self._update_aggregates()
+        self._signatures = {name: tok_txt.signature for name, tok_txt in zip(self.txt_names, tok_txts)}
+        self._metadata_pattern = metadata_pattern
+        with self.profiler.stage('metadata'):
+            self.metadata = self.create_metadata(self.txt_names, metadata_pattern, metadata_file)
+        self._csim = None  # cosine similarity matrix (ndarray), computed on first request and updated incrementally
+        self._sim_indices = {}  # SimilarityIndex for every weighting, built on first request
+        self._inverted = None  # inverted index of tokens (see inverted_index()), built on first request
         print(f'Corpus {self.name} has been created')
 
+    def save(self, path: str):
+        """
+        Writes the Corpus into folder, so it can be opened with Corpus.load() without going through raw texts again.
+        dtm is written as *.npy arrays (see DocTermMatrix.save()), metadata as *.csv and the rest as header.json.
+        Tokens lists of texts are not written, loaded texts keep only their counts and numbers of words.
+        MinHash signatures are written as signatures.npy, if all texts have them, and Corpus sketch as sketch.npz.
+        :param path: (str) Path to folder, created if it does not exist.
+        """
+        self.dtm.save(path)
+        self.metadata.to_csv(os.path.join(path, 'metadata.csv'), index_label='txt_name')
+        minhasher, sketcher = self._tok_params['minhasher'], self._tok_params['sketcher']
+        signatures_path = os.path.join(path, 'signatures.npy')
+        if minhasher is not None and self._has_signatures():
+            save_array(signatures_path, self._signature_matrix())
+        elif os.path.exists(signatures_path):  # left by Corpus saved before into the same folder
+            os.remove(signatures_path)
+        sketch_path = os.path.join(path, 'sketch.npz')
+        if self.sketch is not None:
+            self.sketch.save(sketch_path)
+        elif os.path.exists(sketch_path):  # left by Corpus saved before into the same folder
+            os.remove(sketch_path)
+
+        token_filter = self._tok_params['token_filter']
+        header = {'version': SAVE_VERSION, 'name': self.name, 'txt_names': self.txt_names,
+                  'metadata_pattern': self._metadata_pattern,
+                  'tok_params': {'cache_dir': self._tok_params['cache_dir'], 'stream': self._tok_params['stream'],
+                                 'tokenizer': self._tok_params['tokenizer'],
+                                 'keep_tokens': self._tok_params['keep_tokens'], 'ngram': self.ngram,
+                                 'min_count': self._tok_params['min_count']},
+                  'token_filter': {'min_len': token_filter.min_len, 'stop_words': sorted(token_filter.stop_words)},
+                  'minhasher': None if minhasher is None else {'num_perm': minhasher.num_perm,
+                                                               'shingle_size': minhasher.shingle_size,
+                                                               'seed': minhasher.seed},
+                  'sketcher': None if sketcher is None else sketcher.settings}
+        with open(os.path.join(path, 'header.json'), 'w', encoding='utf-8') as file:
+            json.dump(header, file)
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Opens Corpus written by save(). Nothing is tokenized and dtm arrays are memory-mapped, so loading takes
+        a fraction of the time of building the Corpus and many processes can share one saved Corpus.
+        Loaded Corpus can be analysed and changed (add_text() etc.) as any other.
+        :param path: (str) Path to folder written by save().
+        :param mmap: (bool) If True, dtm arrays are memory-mapped read-only instead of read into memory.
+        :return: (Corpus)
+        """
+        with open(os.path.join(path, 'header.json'), 'r', encoding='utf-8') as file:
+            header = json.load(file)
+        if header.get('version') != SAVE_VERSION:
+            raise ValueError(f"Invalid Corpus file provided. Got version: {header.get('version')}, "
+                             f"Expected: {SAVE_VERSION}")
+
+        corpus = cls.__new__(cls)  # skipping constructor, which would tokenize texts
+        corpus.name = header['name']
+        # Filter is rebuilt from its exact stop-words, so nltk is not needed and token cache keys stay the same
+        token_filter = tkn.TokenFilter(min_len=header['token_filter']['min_len'], stopwords_lang=None,
+                                       extra_stop_words=header['token_filter']['stop_words'])
+        minhasher = MinHasher(**header['minhasher']) if header.get('minhasher') is not None else None
+        sketcher = Sketcher(**header['sketcher']) if header.get('sketcher') is not None else None
+        corpus._tok_params = dict({'ngram': 1, 'min_count': 1}, **header['tok_params'], token_filter=token_filter,
+                                  minhasher=minhasher, sketcher=sketcher)
+        corpus.profiler = NULL_PROFILER
+        corpus._metadata_pattern = header['metadata_pattern']
+        corpus.txt_names = header['txt_names']
+        corpus.dtm = DocTermMatrix.load(path, mmap=mmap)
+        signatures_path = os.path.join(path, 'signatures.npy')
+        signatures = [None] * len(corpus.txt_names)
+        if minhasher is not None and os.path.exists(signatures_path):
+            signatures = np.load(signatures_path)
+            if signatures.shape != (len(corpus.txt_names), minhasher.num_perm):
+                raise ValueError(f"Invalid signatures file provided. Got shape: {signatures.shape}, "
+                                 f"Expected: {(len(corpus.txt_names), minhasher.num_perm)}")
+        corpus._signatures = dict(zip(corpus.txt_names, signatures))
+        corpus.corpus_txts = _DtmTexts(corpus)
+        sketch_path = os.path.join(path, 'sketch.npz')
+        corpus._sketch = FrequencySketch.load(sketch_path, sketcher) \
+            if sketcher is not None and os.path.exists(sketch_path) else None
+        corpus.metadata = pd.read_csv(os.path.join(path, 'metadata.csv'), dtype=str,
+                                      index_col='txt_name').apply(cls._typed_field)
+        corpus.metadata.index = pd.Index(corpus.txt_names, dtype=object)  # keep names exactly as saved
+        corpus._csim = None
+        corpus._update_aggregates()
+        return corpus
+
+    @property
+    def ngram(self):
+        """
+        Number of successive tokens in every term of the Corpus.
+        :return: (int)
+        """
+        return self._tok_params['ngram']
+
     def __str__(self):
         """
         String representation for Corpus class.
@@ -47,56 +270,148 @@ class Corpus:
         return self.name
 
     @staticmethod
-    def create_corpus_dict(folder_path: str):
+    def create_corpus_dict(folder_path: str, workers=None, cache_dir=None, stream=False, tokenizer='nltk',
+                           token_filter=None, keep_tokens=False, ngram=1, min_count=None, minhasher=None, sketcher=None,
+                           profiler=None, sketch=None):
         """
         Creates 'corpus_txts' attribute for Corpus class.
         :param folder_path: (str) Path to folder on which Corpus will be based
+        :param workers: (int) Number of processes used for tokenizing the files. If None or 1, files are tokenized
+            serially. Result is the same in both cases.
+        :param cache_dir: (str) Path to token cache directory. If None, no cache is used.
+        :param stream: (bool) If True, texts are tokenized in streaming mode, without keeping tokens lists.
+        :param tokenizer: (str) Tokenizer backend, 'nltk' or 'fast'.
+        :param token_filter: (TokenFilter) Stop-words and min length filter shared by all texts.
+        :param keep_tokens: (bool) If True, texts keep sequences of their tokens.
+        :param ngram: (int) Number of successive tokens counted as single term.
+        :param min_count: (int) Terms occurring fewer times within a text are dropped from it. Defaults to 1 for single
+            tokens and ngram_count.NGRAM_MIN_COUNT for n-grams.
+        :param minhasher: (MinHasher) If given, texts compute their MinHash signatures.
+        :param sketcher: (Sketcher) If given, texts are counted approximately into sketches.
+        :param profiler: (Profiler) Records stages of every text, also of texts tokenized in worker processes.
+        :param sketch: (FrequencySketch) If given, sketches of texts are merged into it as the texts are created and
+            dropped from the texts, so a single sketch is kept whatever the number of texts.
         :return corpus_dict: (dict) Dictionary with individual *.txt files names as keys and TokenedText as values
         :return n_txt: (int) Number of *.txt files included in Corpus
         :return txt_names: (list) List of *.txt files names (str)
         """
-        # Predefining returning data
-        corpus_dict = {}
-        n_txt = 0
-        txt_names = []
+        txt_names = [file_name for file_name in os.listdir(folder_path)
+                     if file_name.endswith(".txt")]  # ensure to take only *.txt files
+        txt_paths = [os.path.join(folder_path, file_name) for file_name in txt_names]  # full paths to *.txt files
+        n_txt = len(txt_names)  # count the texts
+        profiler = NULL_PROFILER if profiler is None else profiler
+        tok_params = {'cache_dir': cache_dir, 'stream': stream, 'tokenizer': tokenizer, 'token_filter': token_filter,
+                      'keep_tokens': keep_tokens, 'ngram': ngram, 'min_count': min_count, 'minhasher': minhasher,
+                      'sketcher': sketcher}
+
+        if workers is None or workers <= 1:
+            create_tok_txt = partial(tkn.TokenedText, profiler=profiler, **tok_params)
+            tok_txts = _merge_sketches(map(create_tok_txt, txt_paths, txt_names), sketch)
+            return dict(zip(txt_names, tok_txts)), n_txt, txt_names
+
+        # Each file is tokenized in separate process, map() returns TokenedTexts in the order of txt_names
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if not profiler.enabled:
+                tok_txts = pool.map(partial(tkn.TokenedText, **tok_params), txt_paths, txt_names, chunksize=1)
+                tok_txts = _merge_sketches(tok_txts, sketch)
+                return dict(zip(txt_names, tok_txts)), n_txt, txt_names
+
+            # Profiler (and its sink) stays in this process, events recorded in workers are merged into it
+            corpus_dict = {}
+            for file_name, (tok_txt, events) in zip(txt_names, pool.map(
+                    partial(_profiled_tokened_text, **tok_params), txt_paths, txt_names, chunksize=1)):
+                for event in events:
+                    profiler.record(event)
+                corpus_dict[file_name] = next(_merge_sketches([tok_txt], sketch))
+            return corpus_dict, n_txt, txt_names
+
+    @staticmethod
+    def create_metadata(txt_names, metadata_pattern=DEFAULT_METADATA_PATTERN, metadata_file=None):
+        """
+        Creates 'metadata' attribute for Corpus class - parses file names and reads sidecar file, once.
+        :param txt_names: (list) List of *.txt files names (str)
+        :param metadata_pattern: (str) Regular expression with named groups, applied to file names. None to skip.
+        :param metadata_file: (str) Path to *.csv file with 'txt_name' column. None to skip.
+        :return: (DataFrame) Metadata indexed by txt_names, numeric fields are converted to numbers.
+        """
+        metadata = pd.DataFrame(index=pd.Index(txt_names, dtype=object))
+        if metadata_pattern is not None:
+            parsed = pd.Series(txt_names, index=metadata.index, dtype=object).str.extract(metadata_pattern)
+            metadata = metadata.join(parsed.loc[:, [not isinstance(col, int) for col in parsed.columns]])
+        if metadata_file is not None:
+            sidecar = pd.read_csv(metadata_file, dtype=str).set_index('txt_name')
+            metadata = sidecar.reindex(metadata.index).combine_first(metadata)[
+                list(dict.fromkeys(list(metadata.columns) + list(sidecar.columns)))]
+        return metadata.apply(Corpus._typed_field)
 
-        for file_name in os.listdir(folder_path):
-            if file_name.endswith(".txt"):  # ensure to take only *.txt files
-                n_txt += 1  # count the texts
-                txt_names.append(file_name)
-                print(f'Processing {file_name}...')  # terminal output to make sure we got all texts
-                txt_path = os.path.join(folder_path, file_name)  # joining full path to individual *.txt file
-                corpus_dict[file_name] = tkn.TokenedText(txt_path, name=file_name)  # creating TokenedText for this file
-        return corpus_dict, n_txt, txt_names
+    @staticmethod
+    def _typed_field(field):
+        """
+        Converts metadata field (column) of strings into integers or floats, if all its values are numbers.
+        :param field: (Series) Values of metadata field.
+        :return: (Series) Converted values, or field untouched if it is not numeric.
+        """
+        try:
+            numbers = pd.to_numeric(field)
+        except (ValueError, TypeError):
+            return field
+        integral = numbers.dropna()
+        return numbers.astype('Int64') if (integral == integral.round()).all() else numbers
 
     def corpus_tokenize(self):
         """
-        Creates a list of all tokens which occur in files included in Corpus.
+        Creates a list of all tokens which occur in files included in Corpus, taken from the dtm vocabulary.
         :return: (list) of tokens (str)
         """
-        tok_set = set()
-        for toks in self.corpus_txts.values():  # for each TokenedText
-            tok_set = tok_set | set(toks.tokens)  # we extract tokens and create union set with tokens got so far
-        return sorted(list(tok_set))  # convert to list and sort - sorting allows for replicating random picks with seed
+        # dtm vocabulary is already sorted - sorting allows for replicating random picks with seed
+        return list(self.dtm.vocab)
 
     def corpus_words_count(self):
         """
         Counts all occurrences of tokens occurring within the Corpus. Also counts total number of words within Corpus.
-        :return sorted_count: (dict) Tokens (str) for keys and occurrences of token (int) for values.
+        :return count: (dict) Tokens (str) for keys and occurrences of token (int) for values, in order of tokens.
         :return num_words: (int) Total number of words within the Corpus.
         """
-        counts = {k: 0 for k in self.tokens}  # predefining dict with tokens in place
-        num_words = 0
-        for tok_txt in self.corpus_txts.values():  # for each TokenedText in Corpus
-            for t, cnt in tok_txt.counts.items():  # for each term and its count in TokenedText
-                counts[t] += cnt  # add number of occurrences to total number within Corpus
-                num_words += cnt
+        totals = self.dtm.term_totals  # column sums of dtm, aligned with vocabulary
+        return dict(zip(self.dtm.vocab, totals.tolist())), int(totals.sum())
 
-        # Sort the dict for easier handling
-        sorted_count = {k: v for k, v in sorted(counts.items(),  # sort counts items..
-                                                key=lambda item: item[1],  # based on value of the item (count value)..
-                                                reverse=True)}  # and reverse the order, so highest are in front.
-        return sorted_count, num_words
+    @property
+    def counts(self):
+        """
+        Tokens (str) for keys and occurrences of token (int) for values, in order of tokens. Built on first request
+        and kept until the Corpus changes - use most_common() for the most frequent tokens.
+        :return: (dict)
+        """
+        if self._counts is None:
+            self._counts = self.corpus_words_count()[0]
+        return self._counts
+
+    @property
+    def sketch(self):
+        """
+        Approximate counts of all terms of the Corpus - sketches of all texts merged together when the texts are created
+        or added, so only this single sketch is kept.
+        :return: (FrequencySketch) or None, if texts were counted exactly, the sketch was not saved, or a text was
+            removed, replaced or added without sketch since (counts of a text cannot be taken out of the sketch).
+        """
+        return self._sketch
+
+    def most_common(self, n=10):
+        """
+        n most frequent tokens within the Corpus, found with partial selection instead of sorting all tokens.
+        The result is kept until the Corpus changes, so asking again for the same or smaller n is free.
+        For texts counted approximately, tokens and counts are taken from sketch (at most k of them).
+        :param n: (int) Number of tokens.
+        :return: (dict) Tokens (str) for keys and occurrences of token (int) for values, from the most frequent
+            (ties in alphabetical order).
+        """
+        if self.sketch is not None:
+            return self.sketch.most_common(n)
+        totals = self.dtm.term_totals
+        if self._top is None or (len(self._top) < n and len(self._top) < len(totals)):
+            self._top = top_ids(totals, n)
+        vocab = self.dtm.vocab
+        return {vocab[i]: cnt for i, cnt in zip(self._top[:n].tolist(), totals[self._top[:n]].tolist())}
 
     def get_basic_info(self):
         """
@@ -110,24 +425,273 @@ class Corpus:
 
         return '\n'.join((intro, txt_count, distinct_toks, word_count))
 
-    def cos_similarity_matrix(self):
+    def cos_similarity_matrix(self, block_size=None):
         """
         Prepares cosine similarity matrix pair-wise between individual texts within Corpus.
+        The matrix is computed in tiles of block_size rows, every tile from postings of terms of its texts (see
+        DocTermMatrix.block_similarities()), so no dense text x vocabulary array is ever built. Only the most
+        widespread terms, at most CSIM_TILE_CELLS / n_txt of them, are multiplied as dense columns.
+        The matrix is kept within Corpus and updated incrementally when texts are added, removed or replaced.
+        :param block_size: (int) Number of texts per tile. If None, tiles of about CSIM_TILE_CELLS similarities.
         :return: (DataFrame) Cosine similarity matrix
         """
-        csim_df = pd.DataFrame(index=self.txt_names, columns=self.txt_names, dtype=float)  # <n_txt x n_txt> Dataframe
-        for i, txt_a in enumerate(self.txt_names):  # for each text name...
-            if i+1 >= len(self.txt_names):  # if there is no more texts, then drop it
-                continue
-            else:  # else, there are some texts left...
-                for txt_b in self.txt_names[i+1:]:  # grab the next one...
-                    c_sim = comp_a.cosine_similarity(self.corpus_txts[txt_a], self.corpus_txts[txt_b])  # compute...
-                    csim_df.at[txt_a, txt_b] = c_sim
-                    csim_df.at[txt_b, txt_a] = c_sim  # write into matrix, symmetrically (property of cosine sim)
-        csim_df.fillna(1.0, inplace=True)  # cells which are left with no value are on the diagonal, so they have val=1
+        if self._csim is not None:
+            return self._csim_df()
+
+        n = self.dtm.n_docs
+        if block_size is None:
+            block_size = max(CSIM_TILE_CELLS // max(n, 1), 1)
+        csc = self.dtm.to_csc()  # postings of every term, shared by all tiles
+        norms = self.dtm.row_norms()  # length of every text vector in term space
+        dense = self.dtm.dense_terms(CSIM_TILE_CELLS)  # the most widespread terms, multiplied as dense columns
+
+        csim = np.empty((n, n), dtype=np.float64)
+        for i in range(0, n, block_size):
+            csim[i:i + block_size] = self.dtm.block_similarities(i, min(i + block_size, n), csc, norms, dense)
 
+        self._csim = csim
+        return self._csim_df()
+
+    def _csim_df(self):
+        """
+        Converts kept cosine similarity matrix into labeled DataFrame.
+        :return: (DataFrame) Cosine similarity matrix
+        """
+        csim = self._csim.copy()  # kept matrix must not be modified through returned DataFrame
+        np.fill_diagonal(csim, 1.0)
+        csim_df = pd.DataFrame(csim, index=self.txt_names, columns=self.txt_names, dtype=float)  # <n_txt x n_txt>
+        csim_df.fillna(1.0, inplace=True)  # texts with no tokens at all are given val=1, as before
         return csim_df
 
+    def _update_csim_row(self, i):
+        """
+        Recomputes similarities of single text with all the others within kept cosine similarity matrix.
+        :param i: (int) Position of the text within txt_names.
+        """
+        sims = self.dtm.row_similarities(i)
+        self._csim[i, :] = sims
+        self._csim[:, i] = sims  # symmetric property of cosine sim
+
+    def _create_tokened_text(self, txt, name):
+        """
+        Helper for adding texts - takes TokenedText as it is, or tokenizes *.txt file with settings of this Corpus.
+        :param txt: (str) Path to *.txt file or (TokenedText)
+        :param name: (str) Name of the text. Defaults to TokenedText name or *.txt file name.
+        :return: (TokenedText)
+        """
+        if isinstance(txt, tkn.TokenedText):
+            if txt.ngram != self.ngram:
+                raise ValueError(f"Invalid TokenedText provided. Got: ngram={txt.ngram}, Expected: ngram={self.ngram}")
+            if name is not None:
+                txt.name = name
+            return txt
+        return tkn.TokenedText(txt, name=os.path.basename(txt) if name is None else name, profiler=self.profiler,
+                               **self._tok_params)
+
+    def _update_aggregates(self):
+        """
+        Derives tokens, counts and n_words from dtm again, after it has been updated.
+        """
+        self.n_txt = len(self.txt_names)
+        self.tokens = self.corpus_tokenize()
+        # Exact numbers of words of texts, also when dtm holds only the most frequent terms of their sketches
+        self.n_words = int(self.dtm.doc_lengths.sum())
+        self._counts = None  # counts and most_common() are derived again on request
+        self._top = None
+        self._sim_indices = {}  # indices are built again on next query
+        self._inverted = None
+        self._lsh_indices = {}
+
+    def add_text(self, txt, name=None, metadata=None):
+        """
+        Adds single text to the Corpus without rebuilding it. Vocabulary, counts, document frequencies and kept cosine
+        similarity matrix are updated incrementally.
+        :param txt: (str) Path to *.txt file, tokenized with settings of this Corpus, or (TokenedText)
+        :param name: (str) Name of the text within Corpus. Defaults to *.txt file name or TokenedText name.
+        :param metadata: (dict) Metadata fields of the text. Fields not given are parsed from its name.
+        """
+        tok_txt = self._create_tokened_text(txt, name)
+        if tok_txt.name in self.corpus_txts:
+            raise ValueError(f"Text {tok_txt.name} is already within corpus {self.name}, use replace_text() instead")
+
+        n = self.dtm.n_docs
+        with self.profiler.stage('merge_vocab'):
+            self.dtm.set_rows(n, n, [tok_txt.counts], [tok_txt.n_words])  # append as the last row
+        self.corpus_txts[tok_txt.name] = tok_txt
+        self._signatures[tok_txt.name] = tok_txt.signature
+        self.txt_names.append(tok_txt.name)
+        if self._sketch is not None:
+            self._sketch = None if tok_txt.sketch is None else self._sketch.merge(tok_txt.sketch)
+        tok_txt.sketch = None  # its counts are within Corpus sketch
+        self._update_aggregates()
+
+        # Metadata of the new text: parsed from its name and overridden with given fields
+        new_row = self.create_metadata([tok_txt.name], self._metadata_pattern)
+        for field, value in (metadata or {}).items():
+            new_row[field] = [value]
+        self.metadata = pd.concat([self.metadata, new_row]).apply(self._typed_field)
+
+        if self._csim is not None:
+            self._csim = np.pad(self._csim, ((0, 1), (0, 1)))  # room for the new text
+            self._update_csim_row(n)
+
+    def remove_text(self, name: str):
+        """
+        Removes single text from the Corpus without rebuilding it. Terms which occurred only in this text are dropped.
+        :param name: (str) Name of the text within Corpus.
+        """
+        if name not in self.corpus_txts:
+            raise KeyError(f"There is no text {name} within corpus {self.name}")
+
+        i = self.txt_names.index(name)
+        with self.profiler.stage('merge_vocab'):
+            self.dtm.set_rows(i, i + 1, [])
+        del self.corpus_txts[name]
+        del self._signatures[name]
+        self.txt_names.pop(i)
+        self._sketch = None  # counts of the text cannot be taken out of the sketch
+        self.metadata = self.metadata.drop(index=name)
+        self._update_aggregates()
+
+        if self._csim is not None:
+            self._csim = np.delete(np.delete(self._csim, i, axis=0), i, axis=1)
+
+    def replace_text(self, name: str, txt):
+        """
+        Replaces content of single text within the Corpus, keeping its position, without rebuilding the Corpus.
+        :param name: (str) Name of the text within Corpus.
+        :param txt: (str) Path to *.txt file, tokenized with settings of this Corpus, or (TokenedText)
+        """
+        if name not in self.corpus_txts:
+            raise KeyError(f"There is no text {name} within corpus {self.name}")
+
+        tok_txt = self._create_tokened_text(txt, name)
+        i = self.txt_names.index(name)
+        with self.profiler.stage('merge_vocab'):
+            self.dtm.set_rows(i, i + 1, [tok_txt.counts], [tok_txt.n_words])
+        self.corpus_txts[name] = tok_txt
+        self._signatures[name] = tok_txt.signature
+        self._sketch = None  # counts of the replaced text cannot be taken out of the sketch
+        self._update_aggregates()
+
+        if self._csim is not None:
+            self._update_csim_row(i)
+
+    def most_similar(self, query, k=10, weighting='tf_idf'):
+        """
+        Finds k texts most similar (cosine similarity) to the query, without computing full similarity matrix.
+        Search index is built on first query and kept until the Corpus changes.
+        :param query: (str) Name of the text within Corpus or raw text, (TokenedText) or (dict) of counts.
+        :param k: (int) Number of returned texts.
+        :param weighting: (str) Components of text vectors, 'tf' or 'tf_idf' (see SimilarityIndex).
+        :return: (Series) Cosine similarities (float) indexed by text names, from the most similar.
+        """
+        if weighting not in self._sim_indices:
+            self._sim_indices[weighting] = SimilarityIndex(self, weighting)
+        return self._sim_indices[weighting].most_similar(query, k)
+
+    def _has_signatures(self):
+        """
+        Checks whether all texts have MinHash signatures.
+        :return: (bool)
+        """
+        return all(self._signatures[name] is not None for name in self.txt_names)
+
+    def _signature_matrix(self):
+        """
+        MinHash signatures of all texts stacked in txt_names order.
+        :return: (ndarray) shape (n_txt, num_perm).
+        """
+        num_perm = self._tok_params['minhasher'].num_perm
+        return np.array([self._signatures[name] for name in self.txt_names],
+                        dtype=np.uint64).reshape(len(self.txt_names), num_perm)
+
+    def near_duplicates(self, threshold=0.8):
+        """
+        Finds pairs of near-duplicate texts (e.g. reprinted articles), whose estimated Jaccard similarity of shingles
+        reaches the threshold. Candidates are taken from LSH index of MinHash signatures (see minhash_class), so
+        time grows roughly linearly with number of texts, not with number of pairs as in cos_similarity_matrix().
+        The index is built on first request and kept until the Corpus changes.
+        :param threshold: (float) Jaccard similarity threshold, between 0 and 1.
+        :return: (DataFrame) with columns 'text_a', 'text_b' (str) and 'jaccard' (float), from the most similar pair.
+        """
+        if self._tok_params['minhasher'] is None:
+            raise ValueError(f"Corpus {self.name} has no MinHash signatures, create it with minhasher=MinHasher()")
+        if not self._has_signatures():
+            missing = [name for name in self.txt_names if self._signatures[name] is None]
+            raise ValueError(f"Texts without MinHash signature within corpus {self.name}: {missing}")
+
+        if threshold not in self._lsh_indices:
+            self._lsh_indices[threshold] = LSHIndex(self._signature_matrix(), self.txt_names, threshold)
+        return self._lsh_indices[threshold].near_duplicates()
+
+    def inverted_index(self):
+        """
+        Inverted index of the Corpus: texts containing token t are doc_ids[term_ptr[t]:term_ptr[t+1]] (positions
+        within txt_names) and counts of t within them are at the same positions of counts. Token ids follow tokens.
+        Built on first request and kept until the Corpus changes.
+        :return term_ptr: (ndarray) Pointers into doc_ids and counts, shape (n_tokens + 1, ).
+        :return doc_ids: (ndarray) Positions of texts within txt_names (int32).
+        :return counts: (ndarray) Counts of tokens within texts (int32).
+        """
+        if self._inverted is None:
+            self._inverted = self.dtm.to_csc()
+        return self._inverted
+
+    def postings(self, term: str):
+        """
+        Texts containing the term, together with its counts, taken from inverted index.
+        :param term: (str) Token.
+        :return doc_ids: (ndarray) Positions of texts within txt_names (int32), empty if term is not in the Corpus.
+        :return counts: (ndarray) Counts of the term within these texts (int32).
+        """
+        term_ptr, doc_ids, counts = self.inverted_index()
+        t = self.dtm.vocab_ids.get(term)
+        if t is None:
+            return doc_ids[:0], counts[:0]
+        return doc_ids[term_ptr[t]:term_ptr[t + 1]], counts[term_ptr[t]:term_ptr[t + 1]]
+
+    def term_series(self, terms, group_by=None):
+        """
+        Counts of terms within groups of texts (e.g. years or books), computed in one shot from inverted index.
+        :param terms: (list) Terms (str).
+        :param group_by: Group of every text: (str) name of metadata field, (callable) taking text name and returning
+            group, (dict) with text names as keys, or (list) aligned with txt_names. Texts with missing group are left
+            out. If None, every text is a group on its own.
+        :return: (DataFrame) of counts (int), rows are terms and columns are groups (sorted).
+        """
+        if group_by is None:
+            groups = list(self.txt_names)
+        elif isinstance(group_by, str):  # metadata field, parsed when texts entered the Corpus
+            groups = self.metadata[group_by].tolist()
+        elif callable(group_by):
+            groups = [group_by(name) for name in self.txt_names]
+        elif isinstance(group_by, dict):
+            groups = [group_by.get(name) for name in self.txt_names]
+        else:
+            groups = list(group_by)
+
+        # Group code of every text, -1 for texts left out
+        codes, group_labels = pd.factorize(pd.Series(groups, dtype=object), sort=group_by is not None)
+
+        term_ptr, doc_ids, counts = self.inverted_index()
+        term_ids = np.array([self.dtm.vocab_ids.get(term, -1) for term in terms], dtype=np.int64)
+        known = term_ids >= 0
+
+        # Gather postings of all known terms at once
+        starts, stops = term_ptr[term_ids[known]], term_ptr[term_ids[known] + 1]
+        cells = concat_ranges(starts, stops)
+        lens = stops - starts
+        term_rows = np.repeat(np.flatnonzero(known), lens)  # row of every gathered cell within result
+
+        cell_groups = codes[doc_ids[cells]]
+        kept = cell_groups >= 0
+        flat = term_rows[kept] * len(group_labels) + cell_groups[kept]
+        series = np.bincount(flat, weights=counts[cells][kept], minlength=len(terms) * len(group_labels))
+
+        return pd.DataFrame(series.reshape(len(terms), len(group_labels)).astype(np.int64),
+                            index=terms, columns=list(group_labels))
+
     def get_random_tokens(self, n=10, seed=0):
         """
         Helper function to get n random tokens from Corpus based on seed.
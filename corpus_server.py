@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+import corpus_class as corp
+
+'''
+This file defines local analysis server, which loads named corpora once and keeps them in memory, so notebooks and
+scripts query them in milliseconds instead of building Corpus again in every run.
+Corpora are given as name=path pairs - path is either folder written by Corpus.save() (opened with Corpus.load(),
+memory-mapped) or folder with *.txt files (Corpus built once, at start-up).
+Every query is a GET request with parameters in the query string, answered with JSON:
+    - /corpora : names of served corpora
+    - /info?corpus=<name> : basic information (numbers of texts, tokens and words, text names, metadata fields)
+    - /top?corpus=<name>&n=10[&text=<text name>] : the most frequent terms of the corpus or of single text
+    - /tf_idf?corpus=<name>&terms=<term>,<term>... : TF-IDF of terms within every text (null for unknown terms)
+    - /similar?corpus=<name>&query=<text name or raw text>&k=10[&weighting=tf_idf] : the most similar texts
+    - /cosine?corpus=<name>&a=<text name>&b=<text name> : cosine similarity of two texts
+    - /trend?corpus=<name>&terms=<term>,<term>...[&by=period] : counts of terms within groups of texts
+Functions:
+    - serve()
+    - ask()
+Usage: python corpus_server.py --corpus times=exemplar_texts/the_times --corpus plato=saved/plato [--port 8765]
+'''
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+class CorpusService:
+    """
+    A class answering queries on resident corpora. Everything that does not depend on the query (TF-IDF postings,
+    similarity indices, inverted index) is computed once, when the corpus is added. Queries on the same corpus are
+    serialized with its lock, queries on different corpora run concurrently.
+
+    Attributes:
+        corpora (dict) : Names (str) as keys and (Corpus) as values.
+    """
+
+    def __init__(self):
+        """
+        Constructor for CorpusService class.
+        """
+        self.corpora = {}
+        self._tf_idf = {}  # TF-IDF postings of every corpus: (term_ptr, doc_ids, values), see DocTermMatrix.to_csc()
+        self._norms = {}  # L2 norms of count vectors of texts of every corpus
+        self._locks = {}
+        self._routes = {'/corpora': self.list_corpora, '/info': self.info, '/top': self.top, '/tf_idf': self.tf_idf,
+                        '/similar': self.similar, '/cosine': self.cosine, '/trend': self.trend}
+
+    def add_corpus(self, name: str, corpus):
+        """
+        Makes corpus resident and computes everything reused by queries.
+        :param name: (str) Name under which the corpus is queried.
+        :param corpus: (Corpus)
+        """
+        dtm = corpus.dtm
+        tf_idf = dtm.to_csc(dtm.tf_idf().data)
+        corpus.inverted_index()
+        if corpus.n_txt:
+            for weighting in ('tf', 'tf_idf'):  # search indices are built on first query
+                corpus.most_similar(corpus.txt_names[0], k=1, weighting=weighting)
+        self._tf_idf[name] = tf_idf
+        self._norms[name] = dtm.row_norms()
+        self._locks[name] = threading.Lock()
+        self.corpora[name] = corpus
+
+    def load_corpus(self, name: str, path: str, **corpus_params):
+        """
+        Loads corpus from disk and adds it.
+        :param name: (str) Name under which the corpus is queried.
+        :param path: (str) Folder written by Corpus.save(), or folder with *.txt files.
+        :param corpus_params: Arguments of Corpus constructor, used only for folders with *.txt files.
+        """
+        if os.path.exists(os.path.join(path, 'header.json')):
+            corpus = corp.Corpus.load(path)
+        else:
+            corpus = corp.Corpus(path, **corpus_params)
+        self.add_corpus(name, corpus)
+
+    def handle(self, path: str, params: dict):
+        """
+        Answers single query.
+        :param path: (str) Endpoint, e.g. '/top'.
+        :param params: (dict) Query parameters (str) as keys and their values (str) as values.
+        :return: (dict) Answer, serializable to JSON.
+        """
+        if path not in self._routes:
+            raise LookupError(f"Invalid endpoint provided. Got: {path}, Expected one of: {list(self._routes)}")
+        if path == '/corpora':
+            return self.list_corpora()
+
+        name = params.get('corpus')
+        if name not in self.corpora:
+            raise LookupError(f"Invalid corpus provided. Got: {name}, Expected one of: {list(self.corpora)}")
+        with self._locks[name]:
+            return self._routes[path](name, params)
+
+    def list_corpora(self):
+        """
+        :return: (dict) Names of served corpora with their numbers of texts.
+        """
+        return {'corpora': {name: corpus.n_txt for name, corpus in self.corpora.items()}}
+
+    def info(self, name: str, params: dict):
+        """
+        :return: (dict) Basic information of the corpus.
+        """
+        corpus = self.corpora[name]
+        return {'corpus': name, 'name': corpus.name, 'n_txt': corpus.n_txt, 'n_tokens': len(corpus.tokens),
+                'n_words': corpus.n_words, 'txt_names': corpus.txt_names,
+                'metadata_fields': list(corpus.metadata.columns)}
+
+    def top(self, name: str, params: dict):
+        """
+        :return: (dict) The most frequent terms (parameter n) of the corpus, or of its text (parameter text).
+        """
+        corpus = self.corpora[name]
+        n = int(params.get('n', 10))
+        if 'text' in params:
+            if params['text'] not in corpus.txt_names:
+                raise LookupError(f"There is no text {params['text']} within corpus {name}")
+            return {'counts': corpus.corpus_txts[params['text']].most_common(n)}
+        return {'counts': corpus.most_common(n)}
+
+    def tf_idf(self, name: str, params: dict):
+        """
+        Same values as comp_analysis.get_tf_idf_batch(), gathered only from postings of asked terms.
+        :return: (dict) Terms as keys and dicts of TF-IDF within every text as values, None for unknown terms.
+        """
+        corpus = self.corpora[name]
+        term_ptr, doc_ids, values = self._tf_idf[name]
+        answer = {}
+        for term in _split_terms(params):
+            t = corpus.dtm.vocab_ids.get(term)
+            if t is None:  # IDF of unknown term is not defined
+                answer[term] = None
+                continue
+            row = np.zeros(corpus.n_txt, dtype=np.float64)
+            row[doc_ids[term_ptr[t]:term_ptr[t + 1]]] = values[term_ptr[t]:term_ptr[t + 1]]
+            answer[term] = dict(zip(corpus.txt_names, row.tolist()))
+        return {'tf_idf': answer}
+
+    def similar(self, name: str, params: dict):
+        """
+        :return: (dict) Texts most similar to the query (text name or raw text) with their cosine similarities.
+        """
+        corpus = self.corpora[name]
+        sims = corpus.most_similar(params['query'], k=int(params.get('k', 10)),
+                                   weighting=params.get('weighting', 'tf_idf'))
+        return {'similar': dict(zip(sims.index, sims.tolist()))}
+
+    def cosine(self, name: str, params: dict):
+        """
+        :return: (dict) Cosine similarity of term counts of two texts, as in Corpus.cos_similarity_matrix().
+        """
+        corpus = self.corpora[name]
+        for text in (params['a'], params['b']):
+            if text not in corpus.txt_names:
+                raise LookupError(f"There is no text {text} within corpus {name}")
+        dtm, norms = corpus.dtm, self._norms[name]
+        i, j = corpus.txt_names.index(params['a']), corpus.txt_names.index(params['b'])
+        if not norms[i] or not norms[j]:  # empty text, similarity is not defined
+            return {'cosine': None}
+
+        # Only terms shared by both texts contribute, term ids are sorted within every row
+        ids_a, ids_b = (dtm.indices[dtm.indptr[d]:dtm.indptr[d + 1]] for d in (i, j))
+        pos = np.minimum(np.searchsorted(ids_b, ids_a), len(ids_b) - 1)
+        shared = ids_b[pos] == ids_a
+        vals_a, vals_b = (dtm.data[dtm.indptr[d]:dtm.indptr[d + 1]].astype(np.float64) for d in (i, j))
+        dot = np.dot(vals_a[shared], vals_b[pos[shared]])
+        return {'cosine': float(dot / (norms[i] * norms[j]))}
+
+    def trend(self, name: str, params: dict):
+        """
+        :return: (dict) Terms as keys and dicts of their counts within groups (metadata field 'by') as values.
+        """
+        corpus = self.corpora[name]
+        series = corpus.term_series(_split_terms(params), group_by=params.get('by', 'period'))
+        groups = [str(group) for group in series.columns]
+        return {'trend': {term: dict(zip(groups, row)) for term, row in zip(series.index, series.values.tolist())}}
+
+
+def _split_terms(params: dict):
+    """
+    Terms given as comma separated 'terms' parameter.
+    :param params: (dict) Query parameters.
+    :return: (list) Terms (str).
+    """
+    return [term for term in params.get('terms', '').split(',') if term]
+
+
+def _make_handler(service: CorpusService, verbose=False):
+    """
+    Creates request handler class bound to the service.
+    :param service: (CorpusService) Service answering queries.
+    :param verbose: (bool) If True, every request is logged to stderr with its latency.
+    :return: (type) Subclass of BaseHTTPRequestHandler.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            start = time.perf_counter()
+            url = urllib.parse.urlsplit(self.path)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            try:
+                status, answer = 200, service.handle(url.path, params)
+            except KeyError as err:  # missing parameter or unknown metadata field
+                status, answer = 400, {'error': f'Invalid parameter: {err}'}
+            except LookupError as err:  # unknown endpoint, corpus or text
+                status, answer = 404, {'error': str(err)}
+            except (ValueError, TypeError) as err:
+                status, answer = 400, {'error': str(err)}
+            answer['ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+            body = json.dumps(answer).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def serve(service: CorpusService, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """
+    Creates HTTP server answering queries of the service, every client is handled in its own thread.
+    Call serve_forever() on the result to run it and shutdown() to stop it.
+    :param service: (CorpusService) Service with resident corpora.
+    :param host: (str) Address to listen on, local only by default.
+    :param port: (int) Port to listen on, 0 for any free port.
+    :param verbose: (bool) If True, every request is logged to stderr.
+    :return: (ThreadingHTTPServer)
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(service, verbose))
+    server.daemon_threads = True  # clients left open do not block shutdown
+    return server
+
+
+def ask(endpoint: str, host=DEFAULT_HOST, port=DEFAULT_PORT, **params):
+    """
+    Sends single query to running server, e.g. ask('top', corpus='times', n=5).
+    :param endpoint: (str) Endpoint name, e.g. 'top' or '/top'.
+    :param host: (str) Address of the server.
+    :param port: (int) Port of the server.
+    :param params: Query parameters, lists (e.g. terms) are joined with commas.
+    :return: (dict) Answer of the server.
+    """
+    query = urllib.parse.urlencode({key: ','.join(val) if isinstance(val, (list, tuple)) else val
+                                    for key, val in params.items()})
+    url = f"http://{host}:{port}/{endpoint.lstrip('/')}?{query}"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        raise ValueError(json.loads(err.read())['error']) from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local server keeping corpora resident for fast queries.')
+    parser.add_argument('--corpus', action='append', default=[], metavar='NAME=PATH',
+                        help='corpus to serve: folder written by Corpus.save() or folder with *.txt files')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--tokenizer', default='nltk', choices=('nltk', 'fast'),
+                        help='tokenizer of corpora built from *.txt files')
+    parser.add_argument('--cache-dir', default=None, help='token cache of corpora built from *.txt files')
+    parser.add_argument('--workers', type=int, default=None, help='processes tokenizing *.txt files')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+    if not args.corpus:
+        parser.error('at least one --corpus NAME=PATH is required')
+
+    service = CorpusService()
+    for spec in args.corpus:
+        name, sep, path = spec.partition('=')
+        if not sep:
+            parser.error(f'invalid --corpus {spec}, expected NAME=PATH')
+        start = time.perf_counter()
+        service.load_corpus(name, path, tokenizer=args.tokenizer, cache_dir=args.cache_dir, workers=args.workers)
+        print(f'{name}: {service.corpora[name].n_txt} texts ready in {time.perf_counter() - start:.2f} s')
+
+    server = serve(service, args.host, args.port, args.verbose)
+    print(f'Serving {list(service.corpora)} on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+import os
+import tempfile
+from bisect import bisect_left
+from itertools import chain
+import numpy as np
+
+'''
+This file defines DocTermMatrix class, sparse document-term count matrix which is the core representation of Corpus.
+'''
+
+BLOCK_PAIRS = 1 << 21  # (document, document) pairs expanded at once by block_similarities(), about 50 MB
+DENSE_DF_FRACTION = 8  # terms within at least 1/8 of documents are cheaper as dense columns, see dense_terms()
+
+
+def concat_ranges(starts, stops):
+    """
+    Concatenates integer ranges start..stop-1 into single array, without Python loop.
+    Used for gathering postings of many terms from CSC layout at once.
+    :param starts: (ndarray) First positions of the ranges (int).
+    :param stops: (ndarray) Positions after the last ones of the ranges (int).
+    :return: (ndarray) Concatenated ranges (int64).
+    """
+    lens = np.asarray(stops, dtype=np.int64) - starts
+    offsets = np.cumsum(lens) - lens  # position of every range within the result
+    return np.repeat(starts - offsets, lens) + np.arange(lens.sum())
+
+
+def top_ids(values, n):
+    """
+    Ids of n largest values, from the largest, ties in ascending order of ids - the same as n first ids of stable
+    descending sort, but found with partial selection, without sorting all values.
+    :param values: (ndarray) Values (e.g. counts of terms).
+    :param n: (int) Number of returned ids.
+    :return: (ndarray) Ids (int64) of n largest values.
+    """
+    values = np.asarray(values)
+    n = max(min(n, len(values)), 0)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if n == len(values):
+        return np.argsort(-values, kind='stable')
+
+    threshold = np.partition(values, len(values) - n)[len(values) - n]  # n-th largest value
+    above = np.flatnonzero(values > threshold)
+    ties = np.flatnonzero(values == threshold)[:n - len(above)]  # ties at the boundary, lowest ids first
+    ids = np.concatenate((above, ties))
+    return ids[np.lexsort((ids, -values[ids]))]  # only n selected values are sorted
+
+
+def save_array(path: str, array):
+    """
+    Writes array as *.npy file under temporary name within the same folder and then moves it into place, so a file
+    memory-mapped by load() (e.g. when Corpus is saved back into the folder it was loaded from) is never written over,
+    and an interrupted save never leaves truncated file.
+    :param path: (str) Path to *.npy file.
+    :param array: (ndarray) Array to write.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.save(file, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class DocTermMatrix:
+    """
+    A class representing counts of terms within many documents, stored in CSR (compressed sparse row) layout.
+    Row i of the matrix (document i) spans cells indices[indptr[i]:indptr[i+1]] and data[indptr[i]:indptr[i+1]].
+
+    Attributes:
+        vocab (list) : Terms (str), position of the term within the list is its integer id.
+        vocab_ids (dict) : Terms (str) as keys and their integer ids (int) as values.
+        indptr (ndarray) : Row pointers (int64), shape (n_docs + 1, ).
+        indices (ndarray) : Term ids (int32) of non-zero cells, sorted within each row.
+        data (ndarray) : Counts (int32) of non-zero cells, aligned with indices.
+        term_totals (ndarray) : Total number of occurrences (int64) of every term, summed over all documents.
+        doc_freqs (ndarray) : Number of documents (int64) in which every term occurs.
+        doc_lengths (ndarray) : Total number of words (int64) within every document.
+    """
+
+    # Arrays written by save(), CSR arrays are the large ones which are memory-mapped by load()
+    _CSR_ARRAYS = ('indptr', 'indices', 'data')
+    _AGGREGATE_ARRAYS = ('term_totals', 'doc_freqs', 'doc_lengths')
+
+    def __init__(self, vocab, indptr, indices, data, vocab_ids=None, aggregates=None):
+        """
+        Constructor for DocTermMatrix class.
+        :param vocab: (list) Terms (str), position within the list is term id.
+        :param indptr: (ndarray) Row pointers, shape (n_docs + 1, ).
+        :param indices: (ndarray) Term ids of non-zero cells.
+        :param data: (ndarray) Values of non-zero cells.
+        :param vocab_ids: (dict) Terms (str) to ids (int) mapping. Built from vocab on first lookup if not given.
+        :param aggregates: (tuple) of term_totals, doc_freqs and doc_lengths (ndarray), if already known.
+            Computed from the cells if not given.
+        """
+        self.vocab = vocab
+        self._vocab_ids = vocab_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+        # Column and row aggregates, kept in sync by set_rows()
+        if aggregates is not None:
+            self.term_totals, self.doc_freqs, self.doc_lengths = aggregates
+            return
+        self.term_totals = np.bincount(indices, weights=data, minlength=len(vocab)).astype(np.int64)
+        self.doc_freqs = np.bincount(indices, minlength=len(vocab)).astype(np.int64)
+        self.doc_lengths = self._row_sums(indptr, data)
+
+    @classmethod
+    def from_counts(cls, counts_list):
+        """
+        Builds DocTermMatrix from per-document counts dictionaries. Vocabulary is sorted alphabetically.
+        :param counts_list: (list) of (dict) Tokens (str) as keys and their counts (int) as values, one per document.
+        :return: (DocTermMatrix)
+        """
+        return cls.from_arrays([list(cnts) for cnts in counts_list],
+                               [np.fromiter(cnts.values(), dtype=np.int32, count=len(cnts)) for cnts in counts_list])
+
+    @classmethod
+    def from_arrays(cls, terms_list, counts_list, doc_lengths=None):
+        """
+        Builds DocTermMatrix from per-document parallel arrays of terms and counts (e.g. TokenedText terms and
+        term_counts), without building counts dictionaries. Vocabulary is merged in a single pass over the terms,
+        with hash table proportional to the vocabulary, and then sorted alphabetically.
+        :param terms_list: (list) of (list) Unique terms (str), one per document.
+        :param counts_list: (list) of (ndarray) Counts (int) aligned with terms, one per document.
+        :param doc_lengths: (list) Numbers of words (int) within documents, if rows do not hold all their words (e.g.
+            rare n-grams dropped by min_count, or only the most frequent terms of sketches). Defaults to row sums.
+        :return: (DocTermMatrix)
+        """
+        import pandas as pd  # only needed here, so importing this file (e.g. by TokenedText) stays cheap
+
+        row_lens = np.array([len(terms) for terms in terms_list], dtype=np.int64)
+        nnz = int(row_lens.sum())
+
+        # Single merge pass over terms of all documents, within hash table of pandas: every term gets id when it is
+        # seen for the first time
+        flat_terms = np.fromiter(chain.from_iterable(terms_list), dtype=object, count=nnz)
+        indices, terms = pd.factorize(flat_terms)
+        data = np.concatenate([np.asarray(cnts, dtype=np.int32) for cnts in counts_list]) if nnz \
+            else np.zeros(0, dtype=np.int32)
+
+        # Sort vocabulary, so ids are reproducible, and move ids of cells accordingly
+        terms = terms.tolist()
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        remap = np.empty(len(terms), dtype=np.int32)
+        remap[order] = np.arange(len(terms), dtype=np.int32)
+        indices = remap[indices]
+
+        # Sort cells by term id within each row (rows themselves stay in place)
+        rows = np.repeat(np.arange(len(terms_list), dtype=np.int64), row_lens)
+        cells = np.argsort(rows * max(len(terms), 1) + indices, kind='stable')  # single key sorts faster than lexsort
+        indptr = np.zeros(len(terms_list) + 1, dtype=np.int64)
+        np.cumsum(row_lens, out=indptr[1:])  # row pointers are cumulative numbers of distinct terms in documents
+        dtm = cls([terms[i] for i in order], indptr, indices[cells], data[cells])
+        if doc_lengths is not None:
+            dtm.doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+        return dtm
+
+    def save(self, path: str):
+        """
+        Writes the matrix into folder as *.npy files: vocabulary as single utf-8 blob, CSR arrays and aggregates.
+        :param path: (str) Path to folder, created if it does not exist.
+        """
+        os.makedirs(path, exist_ok=True)
+        blob = '\n'.join(self.vocab).encode('utf-8')  # terms never contain whitespace
+        save_array(os.path.join(path, 'vocab.npy'), np.frombuffer(blob, dtype=np.uint8))
+        for attr in self._CSR_ARRAYS + self._AGGREGATE_ARRAYS:
+            save_array(os.path.join(path, f'{attr}.npy'), getattr(self, attr))  # may be mapped from these files
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """
+        Reads the matrix written by save().
+        :param path: (str) Path to folder written by save().
+        :param mmap: (bool) If True, CSR arrays are memory-mapped read-only instead of read into memory, so loading
+            is nearly free and processes using the same files share them through OS page cache. set_rows() still
+            works, it builds new arrays in memory.
+        :return: (DocTermMatrix)
+        """
+        blob = np.load(os.path.join(path, 'vocab.npy')).tobytes()
+        vocab = blob.decode('utf-8').split('\n') if blob else []
+        csr = [np.load(os.path.join(path, f'{attr}.npy'), mmap_mode='r' if mmap else None)
+               for attr in cls._CSR_ARRAYS]
+        # Aggregates are small and updated in place by set_rows(), so they are always read into memory
+        aggregates = tuple(np.load(os.path.join(path, f'{attr}.npy')) for attr in cls._AGGREGATE_ARRAYS)
+        return cls(vocab, *csr, aggregates=aggregates)
+
+    @staticmethod
+    def _flatten_counts(counts_list, vocab_ids):
+        """
+        Converts per-document counts dictionaries into flat arrays of CSR layout.
+        :param counts_list: (list) of (dict) Tokens (str) as keys and their counts (int) as values, one per document.
+        :param vocab_ids: (dict) Terms (str) to ids (int) mapping, containing all terms from counts_list.
+        :return row_lens: (ndarray) Number of distinct terms within every document.
+        :return indices: (ndarray) Term ids, sorted within every document.
+        :return data: (ndarray) Counts aligned with indices.
+        """
+        row_lens = np.array([len(cnts) for cnts in counts_list], dtype=np.int64)
+        nnz = int(row_lens.sum())
+
+        # Flatten all documents into single arrays of term ids and counts
+        indices = np.fromiter((vocab_ids[t] for cnts in counts_list for t in cnts), dtype=np.int32, count=nnz)
+        data = np.fromiter((c for cnts in counts_list for c in cnts.values()), dtype=np.int32, count=nnz)
+
+        # Sort cells by term id within each row (rows themselves stay in place)
+        rows = np.repeat(np.arange(len(counts_list)), row_lens)
+        order = np.lexsort((indices, rows))
+        return row_lens, indices[order], data[order]
+
+    @staticmethod
+    def _row_sums(indptr, data):
+        """
+        Sums values within every row of CSR layout.
+        :param indptr: (ndarray) Row pointers.
+        :param data: (ndarray) Values of non-zero cells.
+        :return: (ndarray) shape (len(indptr) - 1, ) of sums (int64)
+        """
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        return np.bincount(rows, weights=data, minlength=len(indptr) - 1).astype(np.int64)
+
+    @property
+    def vocab_ids(self):
+        """
+        Terms (str) to ids (int) mapping, built on first lookup - loaded matrix does not need it until then.
+        :return: (dict)
+        """
+        if self._vocab_ids is None:
+            self._vocab_ids = {t: i for i, t in enumerate(self.vocab)}
+        return self._vocab_ids
+
+    @property
+    def n_docs(self):
+        """
+        Number of documents (rows) within the matrix.
+        :return: (int)
+        """
+        return len(self.indptr) - 1
+
+    @property
+    def n_terms(self):
+        """
+        Number of terms (columns) within the matrix.
+        :return: (int)
+        """
+        return len(self.vocab)
+
+    def row_ids(self):
+        """
+        Document id of every non-zero cell, aligned with indices and data.
+        :return: (ndarray) of document ids (int)
+        """
+        return np.repeat(np.arange(self.n_docs), np.diff(self.indptr))
+
+    def row_counts(self, i):
+        """
+        Counts of terms within single document.
+        :param i: (int) Document id.
+        :return: (dict) Terms (str) as keys and their counts (int) as values.
+        """
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        return {self.vocab[t]: int(c) for t, c in zip(self.indices[start:stop], self.data[start:stop])}
+
+    def to_csc(self, values=None):
+        """
+        Transposes the matrix into CSC (compressed sparse column) layout, i.e. inverted index of terms:
+        documents containing term t are doc_ids[term_ptr[t]:term_ptr[t+1]], in ascending order.
+        :param values: (ndarray) Values aligned with indices to be transposed. Defaults to data.
+        :return term_ptr: (ndarray) Column pointers (int64), shape (n_terms + 1, ).
+        :return doc_ids: (ndarray) Document ids (int32) of non-zero cells, grouped by term.
+        :return values: (ndarray) Values aligned with doc_ids.
+        """
+        values = self.data if values is None else values
+        order = np.argsort(self.indices, kind='stable')  # stable sort keeps documents ascending within each term
+        term_ptr = np.zeros(self.n_terms + 1, dtype=np.int64)
+        np.cumsum(self.doc_freqs, out=term_ptr[1:])
+        return term_ptr, self.row_ids()[order].astype(np.int32), values[order]
+
+    def idf(self):
+        """
+        Inverse document frequency of every term: log(n_docs / doc_freq).
+        :return: (ndarray) shape (n_terms, ) of IDF values (float)
+        """
+        return np.log(self.n_docs / self.doc_freqs)
+
+    def tf_idf(self):
+        """
+        Computes TF-IDF of every non-zero cell: tf = count / number of words within the document, tf-idf = tf * idf.
+        :return: (DocTermMatrix) Matrix of the same layout and vocabulary, with TF-IDF values (float) as data.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tfs = self.data / self.doc_lengths[self.row_ids()]
+        return DocTermMatrix(self.vocab, self.indptr, self.indices, tfs * self.idf()[self.indices],
+                             vocab_ids=self.vocab_ids)
+
+    def row_norms(self):
+        """
+        Length of every document vector in term space.
+        :return: (ndarray) shape (n_docs, ) of L2 norms (float)
+        """
+        return np.sqrt(np.bincount(self.row_ids(), weights=self.data.astype(np.float64) ** 2, minlength=self.n_docs))
+
+    def row_similarities(self, i):
+        """
+        Cosine similarity between single document and every document within the matrix (itself included).
+        :param i: (int) Document id.
+        :return: (ndarray) shape (n_docs, ) of cosine similarities (float)
+        """
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        query = np.zeros(self.n_terms, dtype=np.float64)  # document i as dense vector
+        query[self.indices[start:stop]] = self.data[start:stop]
+
+        dots = np.bincount(self.row_ids(), weights=query[self.indices] * self.data, minlength=self.n_docs)
+        norms = self.row_norms()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return dots / (norms * norms[i])
+
+    def dense_terms(self, max_cells):
+        """
+        Columns of the most widespread terms (occurring in at least 1 / DENSE_DF_FRACTION of documents) as dense
+        array. Such terms pair almost every two documents, so their part of similarities is a matrix product rather
+        than postings expansion, see block_similarities().
+        :param max_cells: (int) Maximal size of the dense array, limits number of terms to max_cells / n_docs.
+        :return term_ids: (ndarray) Ids (int64) of chosen terms, ascending.
+        :return columns: (ndarray) shape (n_docs, len(term_ids)) of counts (float).
+        """
+        widespread = np.flatnonzero(self.doc_freqs * DENSE_DF_FRACTION >= max(self.n_docs, 1))
+        n_cols = min(len(widespread), max_cells // max(self.n_docs, 1))
+        term_ids = np.sort(widespread[top_ids(self.doc_freqs[widespread], n_cols)])
+
+        cols = np.full(self.n_terms, -1, dtype=np.int64)  # column of every chosen term, -1 for the others
+        cols[term_ids] = np.arange(len(term_ids))
+        cell_cols = cols[self.indices]
+        chosen = cell_cols >= 0
+        columns = np.zeros((self.n_docs, len(term_ids)), dtype=np.float64)
+        columns[self.row_ids()[chosen], cell_cols[chosen]] = self.data[chosen]
+        return term_ids, columns
+
+    def block_similarities(self, start=0, stop=None, csc=None, norms=None, dense=None):
+        """
+        Cosine similarities between block of documents and every document within the matrix, computed from postings
+        of terms of the block only. Every cell (document, term) of the block is paired with documents containing the
+        term, so memory is bounded by the block (stop - start) x n_docs plus BLOCK_PAIRS pairs at once, and no array
+        spans the vocabulary. Terms given in dense are handled by matrix product instead.
+        :param start: (int) First document id of the block.
+        :param stop: (int) Document id after the last one of the block. Defaults to n_docs.
+        :param csc: (tuple) Result of to_csc(), if already computed (e.g. for many blocks).
+        :param norms: (ndarray) Result of row_norms(), if already computed.
+        :param dense: (tuple) Result of dense_terms(), if widespread terms are to be multiplied as dense columns.
+        :return: (ndarray) shape (stop - start, n_docs) of cosine similarities (float), NaN for empty documents.
+        """
+        stop = self.n_docs if stop is None else stop
+        term_ptr, doc_ids, values = self.to_csc() if csc is None else csc
+        norms = self.row_norms() if norms is None else norms
+        n_rows, n = stop - start, self.n_docs
+
+        lo, hi = self.indptr[start], self.indptr[stop]
+        rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(self.indptr[start:stop + 1]))
+        terms = self.indices[lo:hi]
+        cell_vals = self.data[lo:hi].astype(np.float64)
+        if dense is not None:  # cells of dense terms are left out of postings expansion
+            sparse = ~np.isin(terms, dense[0])
+            rows, terms, cell_vals = rows[sparse], terms[sparse], cell_vals[sparse]
+        n_pairs = np.cumsum(term_ptr[terms + 1] - term_ptr[terms])  # postings of every cell, cumulative
+
+        # Cells are processed in chunks of at most BLOCK_PAIRS pairs (single cell with longer postings is a chunk)
+        dots = np.zeros(n_rows * n, dtype=np.float64)
+        bounds = np.searchsorted(n_pairs, np.arange(BLOCK_PAIRS, n_pairs[-1] if len(n_pairs) else 0, BLOCK_PAIRS),
+                                 side='right')
+        for c_lo, c_hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(terms)]))):
+            if c_lo == c_hi:
+                continue
+            chunk_terms = terms[c_lo:c_hi]
+            starts, stops = term_ptr[chunk_terms], term_ptr[chunk_terms + 1]
+            post = concat_ranges(starts, stops)
+            lens = stops - starts
+            flat = np.repeat(rows[c_lo:c_hi] * n, lens) + doc_ids[post]
+            dots += np.bincount(flat, weights=np.repeat(cell_vals[c_lo:c_hi], lens) * values[post],
+                                minlength=n_rows * n)
+
+        dots = dots.reshape(n_rows, n)
+        if dense is not None:
+            dots += dense[1][start:stop] @ dense[1].T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return dots / (norms[start:stop, None] * norms[None, :])
+
+    def set_rows(self, start, stop, counts_list, doc_lengths=None):
+        """
+        Replaces rows start..stop-1 with rows built from counts_list (which may have different length), updating the
+        vocabulary and column aggregates incrementally. Vocabulary stays sorted: new terms are merged into it and terms
+        which no longer occur in any document are dropped, so the result equals matrix built from scratch.
+        E.g. set_rows(n_docs, n_docs, [cnts]) appends a row and set_rows(i, i + 1, []) removes row i.
+        :param start: (int) First document id of replaced block.
+        :param stop: (int) Document id after the last one of replaced block.
+        :param counts_list: (list) of (dict) Tokens (str) as keys and their counts (int) as values, one per new row.
+        :param doc_lengths: (list) Numbers of words (int) within new rows, see from_arrays(). Defaults to row sums.
+        """
+        new_terms = sorted({t for cnts in counts_list for t in cnts if t not in self.vocab_ids})
+        if new_terms:
+            self._insert_terms(new_terms)
+
+        row_lens, new_indices, new_data = self._flatten_counts(counts_list, self.vocab_ids)
+        lo, hi = self.indptr[start], self.indptr[stop]
+        old_indices, old_data = self.indices[lo:hi], self.data[lo:hi]
+
+        # Column aggregates lose the replaced block and gain the new one
+        np.add.at(self.term_totals, old_indices, -old_data.astype(np.int64))
+        np.add.at(self.doc_freqs, old_indices, -1)
+        np.add.at(self.term_totals, new_indices, new_data.astype(np.int64))
+        np.add.at(self.doc_freqs, new_indices, 1)
+
+        # Splice the block into CSR arrays, row pointers after the block are shifted by change of its size
+        new_ptrs = lo + np.cumsum(row_lens)
+        block_ptrs = np.concatenate(([0], np.cumsum(row_lens)))
+        new_lengths = self._row_sums(block_ptrs, new_data) if doc_lengths is None \
+            else np.asarray(doc_lengths, dtype=np.int64)
+        self.doc_lengths = np.concatenate((self.doc_lengths[:start], new_lengths, self.doc_lengths[stop:]))
+        self.indptr = np.concatenate((self.indptr[:start + 1], new_ptrs,
+                                      self.indptr[stop + 1:] + (len(new_indices) - (hi - lo))))
+        self.indices = np.concatenate((self.indices[:lo], new_indices, self.indices[hi:]))
+        self.data = np.concatenate((self.data[:lo], new_data, self.data[hi:]))
+
+        unused = self.doc_freqs[old_indices] == 0  # only terms of replaced block may have disappeared
+        if unused.any():
+            self._drop_terms(self.doc_freqs > 0)
+
+    def _insert_terms(self, new_terms):
+        """
+        Merges new terms into sorted vocabulary and shifts ids of existing terms accordingly.
+        :param new_terms: (list) Sorted terms (str), none of them present in vocabulary.
+        """
+        n_old = self.n_terms
+        # Every existing term moves forward by number of new terms sorted before it. Shift is monotonic,
+        # so term ids within rows stay sorted.
+        insert_at = np.array([bisect_left(self.vocab, t) for t in new_terms], dtype=np.int64)
+        remap = np.arange(n_old) + np.searchsorted(insert_at, np.arange(n_old), side='right')
+
+        self.vocab = sorted(self.vocab + new_terms)
+        self._vocab_ids = None  # ids changed, mapping is built again on next lookup
+        self.indices = remap[self.indices].astype(np.int32)
+        for attr in ('term_totals', 'doc_freqs'):
+            grown = np.zeros(self.n_terms, dtype=np.int64)
+            grown[remap] = getattr(self, attr)
+            setattr(self, attr, grown)
+
+    def _drop_terms(self, keep):
+        """
+        Removes terms from vocabulary and shifts ids of remaining terms accordingly.
+        :param keep: (ndarray) Boolean mask over vocabulary, False for terms to drop. Dropped terms must not occur
+            in any document.
+        """
+        remap = np.cumsum(keep) - 1  # new id of every kept term
+        self.indices = remap[self.indices].astype(np.int32)
+        self.vocab = [t for t, k in zip(self.vocab, keep.tolist()) if k]
+        self._vocab_ids = None  # ids changed, mapping is built again on next lookup
+        self.term_totals = self.term_totals[keep]
+        self.doc_freqs = self.doc_freqs[keep]
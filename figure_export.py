@@ -0,0 +1,178 @@
+import os
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import freq_analysis as freq_a
+import comp_analysis as comp_a
+import result_visualisation as res_v
+
+'''
+This file contains functions for rendering many figures into files at once (e.g. nightly reports), without showing
+them. Every figure is described by a job - its output name, kind of plot and the data it draws, selected from
+Corpus / TokenedText in this process (cheap). Figures are drawn on their own Agg canvas, outside of pyplot, in this
+process or in worker processes - so no window is opened and no figure is kept, whatever backend pyplot uses.
+Rendered files are kept in an output cache keyed by content hash of the plot kind and its data: a figure whose data
+did not change since the last export is copied from the cache instead of drawn again, and jobs with equal data (e.g.
+the same word cloud under several names) are drawn once per export. Every format of a job is saved from a single
+drawing, so slow word clouds are laid out once. The cache is pruned after every export to CACHE_MAX_BYTES, the least
+recently used files first (see prune_cache()).
+Functions:
+    - figure_job()
+    - export_figures()
+    - prune_cache()
+'''
+
+EXPORT_VERSION = 1  # bump when drawing of any plot changes, so cached files get redrawn
+CACHE_FOLDER = '.figure_cache'
+CACHE_MAX_BYTES = 1 << 30  # default size limit of the output cache, 1 GB
+
+# Kinds of plots: functions selecting data of the plot (arguments of drawing function) and drawing it
+PLOTS = {
+    'bar_count': (freq_a.bar_count_args, freq_a.plot_bar_count),
+    'word_cloud': (freq_a.word_cloud_args, freq_a.plot_word_cloud),
+    'tf_idf': (lambda tf_idf_df: {'tf_idf_df': tf_idf_df}, comp_a.plot_tf_idf_matrix),
+    'cos_similarity': (lambda csim_df: {'csim_df': csim_df}, comp_a.plot_cos_similarity_heatmap),
+    'change_over_time': (res_v.change_over_time_args, res_v.plot_term_counts),
+    'change_over_time_plato': (res_v.change_over_time_plato_args, res_v.plot_term_counts),
+    'change_over_time_times': (res_v.change_over_time_times_args, res_v.plot_term_counts),
+}
+
+
+def figure_job(name: str, plot: str, *args, **kwargs):
+    """
+    Describes single figure to export. Data of the figure is selected right away, so objects it was taken from
+    are not needed (nor sent to worker processes) later.
+    E.g. figure_job('times_top', 'bar_count', corpus, n=20) or figure_job('times_csim', 'cos_similarity', csim_df).
+    :param name: (str) Name of output files, without extension.
+    :param plot: (str) Kind of plot, one of PLOTS.
+    :param args: Arguments of the plotting function of given kind (e.g. freq_analysis.create_bar_count()).
+    :param kwargs: Keyword arguments of the plotting function.
+    :return: (tuple) of (str) name, (str) plot and (dict) data drawn by the figure.
+    """
+    if plot not in PLOTS:
+        raise ValueError(f"Invalid plot provided. Got: {plot}, Expected one of: {list(PLOTS)}")
+    select_args, _ = PLOTS[plot]
+    return name, plot, select_args(*args, **kwargs)
+
+
+def _content_key(plot: str, data: dict, dpi: int):
+    """
+    Content hash of a figure - equal for figures drawn from equal data with equal settings.
+    :param plot: (str) Kind of plot.
+    :param data: (dict) Data drawn by the figure.
+    :param dpi: (int) Resolution of raster formats.
+    :return: (str) Hex digest.
+    """
+    h = hashlib.sha256(f'{EXPORT_VERSION}:{plot}:{dpi}:{matplotlib.__version__}:'.encode('utf-8'))
+    h.update(pickle.dumps(data, protocol=4))
+    return h.hexdigest()
+
+
+def _render(plot: str, data: dict, paths: dict, dpi: int):
+    """
+    Draws single figure on Agg canvas and saves it in every format. The figure is not known to pyplot, so it is
+    released as soon as it is not referenced.
+    :param plot: (str) Kind of plot.
+    :param data: (dict) Data drawn by the figure.
+    :param paths: (dict) Formats (str) as keys and output paths (str) as values.
+    :param dpi: (int) Resolution of raster formats.
+    """
+    _, draw = PLOTS[plot]
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    draw(**data, fig=fig)
+    for fmt, path in paths.items():
+        # Written under temporary name first, so an interrupted export never leaves broken file in the cache
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=f'.{fmt}')
+        os.close(fd)
+        try:
+            fig.savefig(tmp_path, format=fmt, dpi=dpi, facecolor=fig.get_facecolor())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def export_figures(jobs, out_dir: str, formats=('png',), workers=None, cache_dir=None, dpi=100,
+                   cache_max_bytes=CACHE_MAX_BYTES):
+    """
+    Renders figures of all jobs into files out_dir/<name>.<format>. Figures with unchanged data are copied from the
+    output cache, figures with equal data are drawn once.
+    :param jobs: (list) Jobs returned from figure_job().
+    :param out_dir: (str) Path to output folder, created if missing.
+    :param formats: (tuple) Formats of files (str), e.g. ('png', 'svg').
+    :param workers: (int) Number of processes drawing figures. If None or 1, figures are drawn in this process.
+    :param cache_dir: (str) Path to output cache folder. Defaults to out_dir/.figure_cache.
+    :param dpi: (int) Resolution of raster formats.
+    :param cache_max_bytes: (int) Size limit of the output cache, applied after the export. None for no limit.
+    :return paths: (dict) Job names (str) as keys and lists of paths (str) of their files as values.
+    :return n_rendered: (int) Number of figures actually drawn, the others were taken from the cache.
+    """
+    cache_dir = os.path.join(out_dir, CACHE_FOLDER) if cache_dir is None else cache_dir
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Distinct figures, jobs with equal content share single cache entry
+    keys, to_render = [], {}
+    for name, plot, data in jobs:
+        key = _content_key(plot, data, dpi)
+        keys.append(key)
+        cached = {fmt: os.path.join(cache_dir, f'{key}.{fmt}') for fmt in formats}
+        if key not in to_render and not all(os.path.exists(path) for path in cached.values()):
+            to_render[key] = (plot, data, cached)
+
+    if workers is None or workers <= 1 or len(to_render) <= 1:
+        for plot, data, cached in to_render.values():
+            _render(plot, data, cached, dpi)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            renders = [pool.submit(_render, plot, data, cached, dpi) for plot, data, cached in to_render.values()]
+            for render in renders:
+                render.result()  # errors of workers are raised here
+
+    paths = {}
+    for (name, _, _), key in zip(jobs, keys):
+        paths[name] = []
+        for fmt in formats:
+            path, cached = os.path.join(out_dir, f'{name}.{fmt}'), os.path.join(cache_dir, f'{key}.{fmt}')
+            shutil.copyfile(cached, path)
+            os.utime(cached)  # marks the file as recently used, so pruning keeps it
+            paths[name].append(path)
+
+    if cache_max_bytes is not None:
+        prune_cache(cache_dir, max_bytes=cache_max_bytes)
+    return paths, len(to_render)
+
+
+def prune_cache(cache_dir: str, max_bytes=None, max_age_days=None):
+    """
+    Removes files from the output cache: older than max_age_days (since last use), then the least recently used ones
+    until the cache fits into max_bytes. Removed figures are drawn again when they are exported next time.
+    :param cache_dir: (str) Path to output cache folder.
+    :param max_bytes: (int) Size limit of the cache. None for no limit.
+    :param max_age_days: (float) Files not used for longer are removed. None for no limit.
+    :return: (int) Number of removed files.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(cache_dir)
+                     if entry.is_file())  # the least recently used first
+
+    removed = 0
+    total = sum(size for _, size, _ in entries)
+    oldest = time.time() - max_age_days * 86400 if max_age_days is not None else None
+    for mtime, size, path in entries:
+        if (oldest is None or mtime >= oldest) and (max_bytes is None or total <= max_bytes):
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
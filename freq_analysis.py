@@ -3,48 +3,82 @@ from wordcloud import WordCloud
 
 import corpus_class as corp
 import tokenedtext_class as tkn
+from ngram_count import NGRAM_NAMES
+from sketch_class import FrequencySketch
 
 '''
 This file contains functions for frequency analysis within single tokened object.
+Every plot is split into selecting its data (*_args(), cheap) and drawing it (plot_*()), so figures can be drawn
+from data alone, e.g. by figure_export.py in worker processes.
 Functions:
     - create_bar_count()
     - create_word_cloud()
 '''
 
 
-def create_bar_count(obj_tok, n=10):
+WORD_CLOUD_MAX_WORDS = 200  # WordCloud draws only this many most frequent terms
+
+
+def subplots(figsize, fig=None):
     """
-    Creates bar plot of n most common used words within tokenized object obj_tok.
-    :param obj_tok: (TokenedText) or (Corpus) Tokenized object.
+    Single axes of new figure, as plt.subplots() - or of given figure, which may live outside of pyplot (e.g. Figure
+    with Agg canvas drawn in batch by figure_export.py, never shown nor kept by pyplot).
+    :param figsize: (tuple) Width and height of the figure in inches.
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
+    :return: (tuple) of (Figure) and (Axes)
+    """
+    if fig is None:
+        return plt.subplots(figsize=figsize)
+    fig.set_size_inches(figsize)
+    return fig, fig.subplots()
+
+
+def bar_count_args(obj_tok, n=10):
+    """
+    Selects data drawn by create_bar_count(), so the plot can be drawn (e.g. in another process) by plot_bar_count().
+    :param obj_tok: (TokenedText) or (Corpus) Tokenized object, or (FrequencySketch) with approximate counts.
     :param n: (int) Number of most common words meant to be on the bar plot.
-    :return: (Figure) Bar plot.
+    :return: (dict) Arguments of plot_bar_count().
     """
-    # Different handling of TokenedText or Corpus
+    # Different handling of TokenedText, Corpus or FrequencySketch
     if isinstance(obj_tok, tkn.TokenedText):
-        cnts = obj_tok.counts
         name = f'text {obj_tok.name}'
+        term_name = NGRAM_NAMES.get(obj_tok.ngram, f'{obj_tok.ngram}-grams')
     elif isinstance(obj_tok, corp.Corpus):
-        cnts = obj_tok.counts
         name = f'corpus {obj_tok.name}'
+        term_name = NGRAM_NAMES.get(obj_tok.ngram, f'{obj_tok.ngram}-grams')
+    elif isinstance(obj_tok, FrequencySketch):
+        name = 'sketch'
+        term_name = 'terms'
     else:
-        raise TypeError('obj_tok must be of type TokenedText or Corpus')  # Making sure we got correct obj_tok type
+        # Making sure we got correct obj_tok type
+        raise TypeError('obj_tok must be of type TokenedText, Corpus or FrequencySketch')
+
+    # Only n most common items are selected, counts are never sorted as a whole. There may be fewer than n terms
+    # within the tokenized object.
+    return {'top_cnts': obj_tok.most_common(n), 'term_name': term_name, 'name': name}
 
-    # Making sure we won't try to print more terms than there are within the tokenized object
-    size = len(list(cnts.keys()))
-    if n >= size:
-        n = size
 
-    # Counts of tokens within obj_tok is always sorted, so just take n first items
-    words = list(cnts.keys())[:n]
-    cnts = list(cnts.values())[:n]
+def plot_bar_count(top_cnts, term_name='words', name='', fig=None):
+    """
+    Creates bar plot of given counts.
+    :param top_cnts: (dict) Terms (str) as keys and counts (int) as values, in plotting order.
+    :param term_name: (str) What the terms are, e.g. 'words' or 'bigrams'.
+    :param name: (str) Name of counted object, shown in the title.
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
+    :return: (Figure) Bar plot.
+    """
+    n = len(top_cnts)
+    words = list(top_cnts.keys())
+    cnts = list(top_cnts.values())
 
     # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, ax = subplots((10, 6), fig)
     ax.bar(words, cnts, color='skyblue', edgecolor='black')
 
-    ax.set_xlabel("Words", fontsize=12)
+    ax.set_xlabel(term_name.capitalize(), fontsize=12)
     ax.set_ylabel("Count", fontsize=12)
-    ax.set_title(f"Top {n} most common words in {name}", fontsize=14)
+    ax.set_title(f"Top {n} most common {term_name} in {name}", fontsize=14)
     ax.set_xticks(range(len(words)))
     ax.set_xticklabels(words, rotation=45, ha='center', fontsize=8)  # Rotate it a bit, so there is no text overlap
     fig.tight_layout()
@@ -52,27 +86,51 @@ def create_bar_count(obj_tok, n=10):
     return fig
 
 
-def create_word_cloud(obj_tok):
+def create_bar_count(obj_tok, n=10):
     """
-    Creates word cloud based on words occurrences within tokenized object obj_tok.
-    :param obj_tok: (TokenedText) or (Corpus) Tokenized object.
-    :return: (Figure) WordCloud plot.
+    Creates bar plot of n most common used words (or n-grams) within tokenized object obj_tok.
+    :param obj_tok: (TokenedText) or (Corpus) Tokenized object, or (FrequencySketch) with approximate counts.
+    :param n: (int) Number of most common words meant to be on the bar plot.
+    :return: (Figure) Bar plot.
     """
-    # Different handling of TokenedText or Corpus.
-    if isinstance(obj_tok, tkn.TokenedText):
-        cnts = obj_tok.counts
-        name = f'text {obj_tok.name}'
-    elif isinstance(obj_tok, corp.Corpus):
-        cnts = obj_tok.counts
-        name = f'corpus {obj_tok.name}'
+    return plot_bar_count(**bar_count_args(obj_tok, n))
+
+
+def word_cloud_args(obj_tok):
+    """
+    Selects data drawn by create_word_cloud(), so the cloud can be drawn (e.g. in another process) by
+    plot_word_cloud(). Only terms which WordCloud draws are kept, so the arguments stay small.
+    :param obj_tok: (TokenedText) or (Corpus) Tokenized object, or (FrequencySketch) with approximate counts.
+        For objects counted approximately, only the most frequent terms of their sketch are drawn.
+    :return: (dict) Arguments of plot_word_cloud().
+    """
+    # Different handling of TokenedText, Corpus or FrequencySketch.
+    if isinstance(obj_tok, (tkn.TokenedText, corp.Corpus)):
+        cnts = obj_tok.most_common(WORD_CLOUD_MAX_WORDS) if obj_tok.sketch is None else obj_tok.sketch.most_common()
+        name = f'text {obj_tok.name}' if isinstance(obj_tok, tkn.TokenedText) else f'corpus {obj_tok.name}'
+    elif isinstance(obj_tok, FrequencySketch):
+        cnts = obj_tok.most_common()
+        name = 'sketch'
     else:
-        raise TypeError('obj_tok must be of type TokenedText or Corpus')
+        raise TypeError('obj_tok must be of type TokenedText, Corpus or FrequencySketch')
+
+    return {'cnts': cnts, 'name': name}
+
 
+def plot_word_cloud(cnts, name='', fig=None):
+    """
+    Creates word cloud of given counts.
+    :param cnts: (dict) Terms (str) as keys and counts (int) as values.
+    :param name: (str) Name of counted object, shown in the title.
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
+    :return: (Figure) WordCloud plot.
+    """
     # Utilizing wordcloud library with dictionary of {term: count}
-    wordcloud = WordCloud(width=800, height=600, background_color='black').generate_from_frequencies(cnts)
+    wordcloud = WordCloud(width=800, height=600, background_color='black',
+                          max_words=WORD_CLOUD_MAX_WORDS).generate_from_frequencies(cnts)
 
     # Plotting
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, ax = subplots((10, 6), fig)
     fig.patch.set_facecolor('black')  # Black background
     ax.imshow(wordcloud, interpolation='bilinear')  # Some interpolation to smooth the image edges
     ax.axis('off')
@@ -80,3 +138,12 @@ def create_word_cloud(obj_tok):
 
     return fig
 
+
+def create_word_cloud(obj_tok):
+    """
+    Creates word cloud based on words (or n-grams) occurrences within tokenized object obj_tok.
+    :param obj_tok: (TokenedText) or (Corpus) Tokenized object, or (FrequencySketch) with approximate counts.
+        For objects counted approximately, only the most frequent terms of their sketch are drawn.
+    :return: (Figure) WordCloud plot.
+    """
+    return plot_word_cloud(**word_cloud_args(obj_tok))
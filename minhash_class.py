@@ -0,0 +1,296 @@
+import json
+import zlib
+import hashlib
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+'''
+This file defines classes for finding near-duplicate texts without comparing all pairs of them:
+    - MinHasher : settings of MinHash signatures (number of permutations, shingle size), shared by all texts.
+    - MinHash : signature of single text, updated block by block with its tokens.
+    - LSHIndex : locality-sensitive hashing index of signatures, which returns candidate pairs of near-duplicates.
+Texts are represented by sets of shingles - sequences of shingle_size successive tokens. Jaccard similarity of two
+such sets is estimated by the fraction of equal components of their signatures.
+'''
+
+_EMPTY = 1 << 32  # signature component of text without any shingle, larger than any permuted (32-bit) value
+_SHIFT = np.uint64(32)
+_MIX = np.uint64(1000003)  # multiplier combining hashes of tokens into hash of shingle
+_BLOCK = 4096  # number of shingles permuted at once, bounds memory to num_perm x _BLOCK values
+
+
+class MinHasher:
+    """
+    A class holding settings and random permutations of MinHash signatures. The same MinHasher has to be used for all
+    texts which are compared.
+
+    Attributes:
+        num_perm (int) : Number of permutations, i.e. length of signatures. Error of Jaccard estimate is about
+            1 / sqrt(num_perm).
+        shingle_size (int) : Number of successive tokens in a shingle.
+        seed (int) : Seed of random permutations.
+        digest (str) : Digest of the settings, part of signature cache keys.
+    """
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1):
+        """
+        Constructor for MinHasher class.
+        :param num_perm: (int) Number of permutations (length of signatures).
+        :param shingle_size: (int) Number of successive tokens in a shingle.
+        :param seed: (int) Seed of random permutations.
+        """
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError(f"Invalid MinHasher settings provided. Got: num_perm={num_perm}, "
+                             f"shingle_size={shingle_size}, Expected: positive integers")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+
+        # Multiply-shift permutations h(x) = ((a * x + b) mod 2^64) >> 32 with odd a - no division needed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64)
+
+        settings = {'num_perm': num_perm, 'shingle_size': shingle_size, 'seed': seed}
+        self.digest = hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()
+
+    def minhash(self):
+        """
+        Creates empty MinHash of a text, to be updated with its tokens.
+        :return: (MinHash)
+        """
+        return MinHash(self)
+
+    def signature(self, tokens):
+        """
+        MinHash signature of a whole sequence of tokens.
+        :param tokens: (list) Tokens (str) of a text, in order.
+        :return: (ndarray) Signature (uint64), shape (num_perm, ).
+        """
+        minhash = self.minhash()
+        minhash.update(tokens)
+        return minhash.signature()
+
+    def encoded_signature(self, terms, token_ids):
+        """
+        MinHash signature of a sequence of tokens encoded as ids of unique terms (see TokenedText), equal to
+        signature() of decoded tokens. Every term is hashed once and tokens are never decoded.
+        :param terms: (list) Unique tokens (str).
+        :param token_ids: (ndarray) Positions of successive tokens within terms.
+        :return: (ndarray) Signature (uint64), shape (num_perm, ).
+        """
+        minhash = self.minhash()
+        term_hashes = np.fromiter(map(_term_hash, terms), dtype=np.uint64, count=len(terms))
+        minhash.update_hashes(term_hashes[np.asarray(token_ids, dtype=np.intp)])
+        return minhash.signature()
+
+    def _permuted_min(self, shingles):
+        """
+        Minimum of every permutation over hashes of shingles.
+        :param shingles: (ndarray) Unique 32-bit hashes of shingles (uint64).
+        :return: (ndarray) shape (num_perm, ) of minimal permuted hashes (uint64).
+        """
+        mins = np.full(self.num_perm, _EMPTY, dtype=np.uint64)
+        buffer = np.empty((self.num_perm, min(len(shingles), _BLOCK)), dtype=np.uint64)  # reused for every block
+        for start in range(0, len(shingles), _BLOCK):
+            block = shingles[start:start + _BLOCK]
+            permuted = buffer[:, :len(block)]
+            np.multiply(self._a[:, None], block[None, :], out=permuted)  # uint64 arithmetic wraps around
+            permuted += self._b[:, None]
+            # Shifting keeps order, so it is applied to minima only
+            np.minimum(mins, permuted.min(axis=1) >> _SHIFT, out=mins)
+        return mins
+
+
+class MinHash:
+    """
+    A class accumulating MinHash signature of single text, which may be fed with successive blocks of its tokens
+    (e.g. chunks of streamed file). Shingles spanning two blocks are taken into account.
+    """
+
+    def __init__(self, hasher: MinHasher):
+        """
+        Constructor for MinHash class.
+        :param hasher: (MinHasher) Settings and permutations.
+        """
+        self.hasher = hasher
+        self._mins = np.full(hasher.num_perm, _EMPTY, dtype=np.uint64)
+        self._carry = np.zeros(0, dtype=np.uint64)  # hashes of last shingle_size - 1 tokens of previous block
+        self._term_hashes = {}  # crc32 of every term, computed once per term
+
+    def update(self, tokens):
+        """
+        Adds next block of tokens of the text.
+        :param tokens: (list) Tokens (str), continuing tokens given before.
+        """
+        term_hashes = self._term_hashes
+        for term in dict.fromkeys(tokens):
+            if term not in term_hashes:
+                term_hashes[term] = _term_hash(term)
+        self.update_hashes(np.fromiter(map(term_hashes.__getitem__, tokens), dtype=np.uint64, count=len(tokens)))
+
+    def update_hashes(self, token_hashes):
+        """
+        Adds next block of tokens of the text, given as their hashes.
+        :param token_hashes: (ndarray) Hashes of tokens (uint64), see _term_hash().
+        """
+        if not len(token_hashes):
+            return
+        hashes = np.concatenate((self._carry, token_hashes))
+        k = self.hasher.shingle_size
+        self._carry = hashes[-(k - 1):].copy() if k > 1 else hashes[:0]
+
+        n_shingles = len(hashes) - k + 1
+        if n_shingles > 0:
+            self._add_shingles(np.unique(self._shingle_hashes(hashes, n_shingles)))
+
+    def signature(self):
+        """
+        Signature of all tokens given so far. Text shorter than a single shingle is represented by all its tokens.
+        :return: (ndarray) Signature (uint64), shape (num_perm, ). All components are equal to the largest value for
+            text without tokens.
+        """
+        if (self._mins == _EMPTY).all() and len(self._carry):  # fewer tokens than shingle_size
+            self._add_shingles(self._shingle_hashes(self._carry, 1))
+        return self._mins.copy()
+
+    @staticmethod
+    def _shingle_hashes(hashes, n_shingles):
+        """
+        Combines hashes of successive tokens into 32-bit hashes of shingles.
+        :param hashes: (ndarray) Hashes of tokens (uint64).
+        :param n_shingles: (int) Number of shingles, len(hashes) - shingle_size + 1.
+        :return: (ndarray) Hashes of shingles (uint64).
+        """
+        combined = np.zeros(n_shingles, dtype=np.uint64)
+        for m in range(len(hashes) - n_shingles + 1):  # for every position within shingle
+            combined = combined * _MIX ^ hashes[m:m + n_shingles]  # uint64 arithmetic wraps around
+        return (combined ^ (combined >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+
+    def _add_shingles(self, shingles):
+        """
+        Updates signature with hashes of shingles.
+        :param shingles: (ndarray) Hashes of shingles (uint64).
+        """
+        np.minimum(self._mins, self.hasher._permuted_min(shingles), out=self._mins)
+
+
+def _term_hash(term: str):
+    """
+    32-bit hash of a term, stable across processes and runs (unlike built-in hash()).
+    :param term: (str) Token.
+    :return: (int)
+    """
+    return zlib.crc32(term.encode('utf-8'))
+
+
+def jaccard_estimate(signature_a, signature_b):
+    """
+    Estimates Jaccard similarity of shingle sets of two texts from their signatures.
+    :param signature_a: (ndarray) Signature of the first text.
+    :param signature_b: (ndarray) Signature of the second text, made by the same MinHasher.
+    :return: (float) Fraction of equal signature components.
+    """
+    return float(np.mean(np.asarray(signature_a) == np.asarray(signature_b)))
+
+
+def _optimal_bands(threshold: float, num_perm: int):
+    """
+    Chooses number of bands and rows per band of LSH, so that probability of texts becoming candidates rises sharply
+    at the threshold: sum of probabilities of false positives (below threshold) and false negatives (above it)
+    is minimal.
+    :param threshold: (float) Jaccard similarity threshold.
+    :param num_perm: (int) Length of signatures.
+    :return: (tuple) of number of bands (int) and rows per band (int).
+    """
+    sims = np.linspace(0, 1, 201)
+    best, best_err = (num_perm, 1), np.inf
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        candidate = 1 - (1 - sims ** rows) ** bands  # probability of sharing at least one bucket
+        err = np.mean(np.where(sims < threshold, candidate, 1 - candidate))  # integral over evenly spaced sims
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class LSHIndex:
+    """
+    A class representing locality-sensitive hashing index of MinHash signatures. Signatures are cut into bands, texts
+    with equal band fall into the same bucket and become candidate pair. Building the index and finding candidates take
+    time roughly linear in number of texts (plus number of candidate pairs).
+
+    Attributes:
+        signatures (ndarray) : Signatures of indexed texts (uint64), shape (n_texts, num_perm).
+        names (list) : Names of indexed texts (str).
+        threshold (float) : Jaccard similarity threshold the index was tuned for.
+        bands (int) : Number of bands.
+        rows (int) : Number of signature components in a band.
+        tables (list) : For every band, (dict) with band values (bytes) as keys and positions of texts within names
+            (list) as values.
+    """
+
+    def __init__(self, signatures, names, threshold=0.8):
+        """
+        Constructor for LSHIndex class.
+        :param signatures: (ndarray) Signatures of texts, shape (n_texts, num_perm). Texts without any shingle are not
+            indexed.
+        :param names: (list) Names of texts (str), aligned with signatures.
+        :param threshold: (float) Jaccard similarity threshold, between 0 and 1.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Invalid threshold provided. Got: {threshold}, Expected: number in (0, 1]")
+        self.names = list(names)
+        self.signatures = np.asarray(signatures, dtype=np.uint64).reshape(len(self.names), -1)
+        self.threshold = threshold
+        self.bands, self.rows = _optimal_bands(threshold, self.signatures.shape[1])
+
+        self.tables = [{} for _ in range(self.bands)]
+        for i in np.flatnonzero((self.signatures != _EMPTY).any(axis=1)).tolist():
+            for band, key in enumerate(self._band_keys(self.signatures[i])):
+                self.tables[band].setdefault(key, []).append(i)
+
+    def _band_keys(self, signature):
+        """
+        Cuts signature into bands.
+        :param signature: (ndarray) Signature (uint64).
+        :return: (list) of bands (bytes), hashable keys of buckets.
+        """
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def candidate_pairs(self):
+        """
+        Pairs of texts sharing at least one bucket.
+        :return: (set) of (tuple) of positions (int) within names, smaller first.
+        """
+        return {pair for table in self.tables for bucket in table.values() if len(bucket) > 1
+                for pair in combinations(bucket, 2)}  # positions were added in ascending order
+
+    def near_duplicates(self, threshold=None):
+        """
+        Candidate pairs whose estimated Jaccard similarity reaches the threshold.
+        :param threshold: (float) Jaccard similarity threshold. Defaults to threshold of the index.
+        :return: (DataFrame) with columns 'text_a', 'text_b' (str) and 'jaccard' (float), from the most similar pair.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        pairs = np.array(sorted(self.candidate_pairs()), dtype=np.int64).reshape(-1, 2)
+        # Estimated Jaccard of all candidate pairs at once
+        jaccard = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis=1)
+        kept = jaccard >= threshold
+
+        duplicates = pd.DataFrame({'text_a': [self.names[i] for i in pairs[kept, 0].tolist()],
+                                   'text_b': [self.names[j] for j in pairs[kept, 1].tolist()],
+                                   'jaccard': jaccard[kept]})
+        return duplicates.sort_values('jaccard', ascending=False, kind='stable', ignore_index=True)
+
+    def query(self, signature):
+        """
+        Indexed texts which share a bucket with a signature of another text.
+        :param signature: (ndarray) Signature made by the same MinHasher.
+        :return: (list) Names of candidate texts (str).
+        """
+        found = set()
+        for table, key in zip(self.tables, self._band_keys(np.asarray(signature, dtype=np.uint64))):
+            found.update(table.get(key, ()))
+        return [self.names[i] for i in sorted(found)]
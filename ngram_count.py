@@ -0,0 +1,206 @@
+import numpy as np
+
+'''
+This file contains functions for counting n-grams (sequences of n successive tokens, e.g. bigrams "prime minister")
+of a text. Tokens are encoded as integer ids and every n-gram as single int64 key, so n-grams are counted without
+building any str or tuple per occurrence. Only n-grams which survive min_count pruning are decoded into terms,
+tokens of n-gram joined with NGRAM_SEPARATOR - such terms can be used as any other tokens.
+Functions:
+    - ngram_keys()
+    - decode_keys()
+    - count_ngrams()
+    - default_min_count()
+Class NGramCounter counts n-grams of streamed tokens, block by block, in bounded memory.
+'''
+
+NGRAM_SEPARATOR = ' '  # tokens never contain whitespaces, so n-gram terms can be split back into tokens
+NGRAM_NAMES = {1: 'words', 2: 'bigrams', 3: 'trigrams'}  # used in plot labels, other n are called 'n-grams'
+NGRAM_MIN_COUNT = 2  # default min_count of n-grams - most n-grams of a text occur only once
+NGRAM_CAPACITY = 1 << 20  # distinct n-grams kept by NGramCounter, about 32 MB
+
+
+def default_min_count(n: int, min_count=None):
+    """
+    min_count used when none is given: single tokens are all kept, n-grams occurring once are dropped.
+    :param n: (int) Number of tokens in n-gram.
+    :param min_count: (int) Given min_count, returned as it is unless None.
+    :return: (int)
+    """
+    if min_count is not None:
+        return min_count
+    return 1 if n == 1 else NGRAM_MIN_COUNT
+
+
+def _key_bits(n: int):
+    """
+    Number of bits of n-gram key taken by every token id, so n ids fit into non-negative int64.
+    :param n: (int) Number of tokens in n-gram.
+    :return: (int)
+    """
+    return 63 // n
+
+
+def ngram_keys(token_ids, n=2):
+    """
+    Encodes every n-gram of the sequence as single integer - ids of its tokens packed into bits of int64.
+    :param token_ids: (ndarray) Ids of successive tokens.
+    :param n: (int) Number of tokens in n-gram.
+    :return: (ndarray) Keys (int64) of successive n-grams, len(token_ids) - n + 1 of them.
+    """
+    ids = np.asarray(token_ids, dtype=np.int64)
+    n_grams = max(len(ids) - n + 1, 0)
+    bits = np.int64(_key_bits(n))
+    keys = ids[:n_grams].copy()
+    for m in range(1, n):  # shift in id of every next token of n-gram
+        keys <<= bits
+        keys |= ids[m:m + n_grams]
+    return keys
+
+
+def decode_keys(keys, terms, n=2):
+    """
+    Converts n-gram keys back into terms.
+    :param keys: (ndarray) Keys (int64) returned from ngram_keys().
+    :param terms: (list) Tokens (str), indexed by token ids.
+    :param n: (int) Number of tokens in n-gram.
+    :return: (list) n-gram terms (str) - tokens joined with NGRAM_SEPARATOR.
+    """
+    bits = _key_bits(n)
+    mask = np.int64((1 << bits) - 1)
+    parts = [((keys >> np.int64(bits * (n - 1 - m))) & mask).tolist() for m in range(n)]  # ids at every position
+    return [NGRAM_SEPARATOR.join(words) for words in zip(*(map(terms.__getitem__, ids) for ids in parts))]
+
+
+def _check_vocabulary(n_terms: int, n: int):
+    """
+    Makes sure that ids of all tokens fit into their bits of n-gram key.
+    :param n_terms: (int) Number of distinct tokens.
+    :param n: (int) Number of tokens in n-gram.
+    """
+    if n_terms > 1 << _key_bits(n):
+        raise ValueError(f"Too many distinct tokens for {n}-grams. Got: {n_terms}, "
+                         f"Expected at most: {1 << _key_bits(n)}")
+
+
+def count_ngrams(terms, token_ids, n=2, min_count=NGRAM_MIN_COUNT):
+    """
+    Counts n-grams of a text encoded as token ids, in a single hashing pass over integer keys.
+    :param terms: (list) Unique tokens (str) of the text, indexed by token ids.
+    :param token_ids: (ndarray) Ids of successive tokens of the text.
+    :param n: (int) Number of tokens in n-gram.
+    :param min_count: (int) n-grams occurring fewer times are dropped before they are decoded.
+    :return terms: (list) n-gram terms (str), in order of first occurrence.
+    :return counts: (ndarray) Counts (int32) aligned with terms.
+    """
+    import pandas as pd  # imported only when n-grams are counted, so importing TokenedText stays cheap
+
+    _check_vocabulary(len(terms), n)
+    codes, keys = pd.factorize(ngram_keys(token_ids, n))  # unique keys in order of first occurrence
+    counts = np.bincount(codes, minlength=len(keys)).astype(np.int32)
+    if min_count > 1:
+        kept = counts >= min_count
+        keys, counts = keys[kept], counts[kept]
+    return decode_keys(keys, terms, n), counts
+
+
+class NGramCounter:
+    """
+    A class counting n-grams of tokens given block by block (e.g. streamed file). n-grams spanning two blocks are
+    counted as well, so the result is the same as of count_ngrams() on all tokens at once - as long as the text has at
+    most capacity distinct n-grams.
+    Memory is bounded by capacity: when more n-grams are kept, the rarest ones are dropped (lossy counting), until
+    half of capacity is left. Every drop raises max_error - the largest count an n-gram may lose. Then every
+    reported count is lower than the true count by at most max_error, and every n-gram occurring more than max_error
+    times is reported.
+
+    Attributes:
+        n (int) : Number of tokens in n-gram.
+        capacity (int) : Maximal number of distinct n-grams kept.
+        term_ids (dict) : Tokens (str) as keys and their ids (int) as values, in order of first occurrence.
+        max_error (int) : Maximal underestimation of reported counts, 0 while nothing was dropped.
+        total (int) : Number of n-grams counted so far, dropped ones included.
+    """
+
+    def __init__(self, n=2, capacity=NGRAM_CAPACITY):
+        """
+        Constructor for NGramCounter class.
+        :param n: (int) Number of tokens in n-gram.
+        :param capacity: (int) Maximal number of distinct n-grams kept.
+        """
+        if capacity < 2:
+            raise ValueError(f"Invalid capacity provided. Got: {capacity}, Expected: at least 2")
+        self.n = n
+        self.capacity = capacity
+        self.term_ids = {}
+        self.max_error = 0
+        self._carry = np.zeros(0, dtype=np.int64)  # ids of last n - 1 tokens of previous block
+        self._seen = 0  # number of n-grams counted so far, i.e. position of the next one
+        # Kept n-grams, sorted by key: counts, counts they may have missed before being (re)inserted, and positions of
+        # their first occurrences (which order the result)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._missed = np.zeros(0, dtype=np.int64)
+        self._first = np.zeros(0, dtype=np.int64)
+
+    def update(self, tokens):
+        """
+        Counts n-grams of next block of tokens.
+        :param tokens: (list) Tokens (str), continuing tokens given before.
+        """
+        term_ids = self.term_ids
+        ids = np.fromiter((term_ids.setdefault(tk, len(term_ids)) for tk in tokens), dtype=np.int64,
+                          count=len(tokens))
+        ids = np.concatenate((self._carry, ids))
+        self._carry = ids[max(len(ids) - self.n + 1, 0):].copy()
+
+        block_keys = ngram_keys(ids, self.n)
+        keys, first, counts = np.unique(block_keys, return_index=True, return_counts=True)
+
+        # n-grams kept already are incremented, new ones are merged in at their sorted positions
+        pos = np.searchsorted(self._keys, keys)
+        found = pos < len(self._keys)
+        found[found] = self._keys[pos[found]] == keys[found]
+        self._counts[pos[found]] += counts[found]
+        new, at = ~found, pos[~found]
+        self._keys = np.insert(self._keys, at, keys[new])
+        self._counts = np.insert(self._counts, at, counts[new])
+        self._missed = np.insert(self._missed, at, self.max_error)  # could have been dropped before
+        self._first = np.insert(self._first, at, self._seen + first[new])
+        self._seen += len(block_keys)
+
+        if len(self._keys) > self.capacity:
+            self._prune()
+
+    @property
+    def total(self):
+        """
+        Number of n-grams counted so far, dropped ones included.
+        :return: (int)
+        """
+        return self._seen
+
+    def _prune(self):
+        """
+        Drops the n-grams with the lowest upper bounds of their true counts, so half of capacity is left.
+        """
+        upper = self._counts + self._missed
+        threshold = np.partition(upper, len(upper) - self.capacity // 2 - 1)[len(upper) - self.capacity // 2 - 1]
+        kept = upper > threshold  # dropped n-grams occurred at most threshold times so far
+        self.max_error = max(self.max_error, int(threshold))
+        self._keys, self._counts = self._keys[kept], self._counts[kept]
+        self._missed, self._first = self._missed[kept], self._first[kept]
+
+    def arrays(self, min_count=NGRAM_MIN_COUNT):
+        """
+        Counted n-grams as parallel arrays.
+        :param min_count: (int) n-grams occurring fewer times are dropped before they are decoded.
+        :return terms: (list) n-gram terms (str), in order of first occurrence.
+        :return counts: (ndarray) Counts (int32) aligned with terms.
+        """
+        _check_vocabulary(len(self.term_ids), self.n)
+        order = np.argsort(self._first, kind='stable')
+        keys, counts = self._keys[order], self._counts[order].astype(np.int32)
+        if min_count > 1:
+            kept = counts >= min_count
+            keys, counts = keys[kept], counts[kept]
+        return decode_keys(keys, list(self.term_ids), self.n), counts
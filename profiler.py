@@ -0,0 +1,155 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+'''
+This file defines Profiler class - opt-in instrumentation of TokenedText and Corpus. Time of every stage (loading,
+cleaning, tokenizing, counting, vocabulary merging...) and counters (tokens, terms...) are recorded per document and
+aggregated, and every record is passed to a pluggable sink (callback, e.g. print_sink or JsonLinesSink).
+When no profiler is given, NULL_PROFILER is used, which does nothing at all.
+'''
+
+
+class Profiler:
+    """
+    A class collecting timings and counters of processing stages.
+    Each record (event) is a dict: {'stage': (str), 'doc': (str), 'seconds': (float)} for timed stages and
+    {'counter': (str), 'doc': (str), 'value': (int)} for counters. 'doc' is None outside of any document.
+
+    Attributes:
+        enabled (bool) : Always True, False only for NULL_PROFILER.
+        sink (callable) : Called with every event (dict), or None.
+        totals (dict) : Stage names (str) as keys and dicts {'calls': (int), 'seconds': (float)} as values.
+        counters (dict) : Counter names (str) as keys and summed values (int) as values.
+        per_document (dict) : Document names (str) as keys and dicts of stage seconds and counter values as values.
+    """
+    enabled = True
+
+    def __init__(self, sink=None):
+        """
+        Constructor for Profiler class.
+        :param sink: (callable) Function called with every event (dict), e.g. print_sink or JsonLinesSink.
+        """
+        self.sink = sink
+        self.totals = {}
+        self.counters = {}
+        self.per_document = {}
+        self._doc = None  # document currently processed, see document()
+
+    @contextmanager
+    def document(self, name: str):
+        """
+        Context in which all stages and counters are attributed to a document.
+        :param name: (str) Name of the document.
+        """
+        outer, self._doc = self._doc, name
+        try:
+            yield
+        finally:
+            self._doc = outer
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context measuring wall time of a stage.
+        :param name: (str) Name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record({'stage': name, 'doc': self._doc, 'seconds': time.perf_counter() - start})
+
+    def count(self, name: str, value=1):
+        """
+        Adds value to a counter.
+        :param name: (str) Name of the counter.
+        :param value: (int) Added value.
+        """
+        self.record({'counter': name, 'doc': self._doc, 'value': int(value)})
+
+    def record(self, event: dict):
+        """
+        Aggregates single event and passes it to the sink. Also used for merging events recorded in worker processes.
+        :param event: (dict) Event created by stage() or count().
+        """
+        doc_stats = self.per_document.setdefault(event['doc'], {}) if event['doc'] is not None else {}
+        if 'stage' in event:
+            total = self.totals.setdefault(event['stage'], {'calls': 0, 'seconds': 0.0})
+            total['calls'] += 1
+            total['seconds'] += event['seconds']
+            doc_stats[event['stage']] = doc_stats.get(event['stage'], 0.0) + event['seconds']
+        else:
+            self.counters[event['counter']] = self.counters.get(event['counter'], 0) + event['value']
+            doc_stats[event['counter']] = doc_stats.get(event['counter'], 0) + event['value']
+
+        if self.sink is not None:
+            self.sink(event)
+
+    def report(self):
+        """
+        Prepares table of aggregated stage timings and counters.
+        :return: (str)
+        """
+        lines = [f"{'Stage:'.ljust(16)} {'Calls:'.rjust(8)} {'Time [s]:'.rjust(10)}"]
+        for stage, total in sorted(self.totals.items(), key=lambda item: item[1]['seconds'], reverse=True):
+            lines.append(f"{stage.ljust(16)} {total['calls']:8d} {total['seconds']:10.3f}")
+        lines += [f"{name.ljust(16)} {value:19d}" for name, value in self.counters.items()]
+        return '\n'.join(lines)
+
+
+class _NullProfiler:
+    """
+    Profiler which records nothing - stages and documents are shared no-op contexts, so disabled instrumentation costs
+    a single method call per stage.
+    """
+    enabled = False
+    _NULL_CONTEXT = nullcontext()
+
+    def document(self, name: str):
+        return self._NULL_CONTEXT
+
+    def stage(self, name: str):
+        return self._NULL_CONTEXT
+
+    def count(self, name: str, value=1):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def print_sink(event: dict):
+    """
+    Sink printing every event in a single line.
+    :param event: (dict) Event recorded by Profiler.
+    """
+    doc = event['doc'] if event['doc'] is not None else '-'
+    if 'stage' in event:
+        print(f"{doc}: {event['stage']} {event['seconds']:.4f} s")
+    else:
+        print(f"{doc}: {event['counter']} {event['value']}")
+
+
+class JsonLinesSink:
+    """
+    Sink appending every event as single JSON line into a log file.
+
+    Attributes:
+        path (str) : Path to the log file.
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor for JsonLinesSink class.
+        :param path: (str) Path to the log file. Events are appended to it, existing content is kept.
+        """
+        self.path = path
+
+    def __call__(self, event: dict):
+        """
+        Appends event to the log file, with time of recording.
+        :param event: (dict) Event recorded by Profiler.
+        """
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(dict(event, time=time.time())) + '\n')
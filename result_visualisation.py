@@ -6,86 +6,139 @@ import comp_analysis as comp_a
 import matplotlib.pyplot as plt
 
 '''
-This file contains functions for special cases of result plotting within different Corpora
+This file contains functions for special cases of result plotting within different Corpora.
+Every plot is split into selecting its data (*_args()) and drawing it (plot_term_counts()), so figures can be drawn
+from data alone, e.g. by figure_export.py in worker processes.
 '''
 
 
-def change_over_time_plato(corpus: corp.Corpus, terms):
+def change_over_time_args(corpus: corp.Corpus, terms, by='period', groups=None, group_label=None):
     """
-    Plots terms count over successive books within Plato's Republic Corpus.
-    :param corpus: (Corpus) Plato's Republic Corpus.
-    :param terms: (list) List of terms (str), which will be plotted against successive books.
+    Selects data drawn by change_over_time(), so the plot can be drawn (e.g. in another process) by
+    plot_term_counts(). Groups are taken from metadata field of the Corpus, so no file names are scanned here.
+    :param corpus: (Corpus) Corpus with metadata field 'by'.
+    :param terms: (list) List of terms (str), which will be plotted against successive groups.
+    :param by: (str) Name of metadata field, which defines groups of texts.
+    :param groups: (iterable) Groups to plot, in plotting order. If None, all groups found in the Corpus, sorted.
+    :param group_label: (str) Label of x axis. Defaults to metadata field name.
+    :return: (dict) Arguments of plot_term_counts().
+    """
+    if by not in corpus.metadata.columns:
+        raise ValueError(f"Invalid metadata field provided. Got: {by}, "
+                         f"Expected one of: {list(corpus.metadata.columns)}")
+
+    # Counts of all terms in all groups found in the Corpus at once, <n_terms x n_groups>
+    term_counts = corpus.term_series(terms, group_by=by)
+    if groups is None:
+        groups = sorted(term_counts.columns)
+    valid_groups = [g for g in groups if g in term_counts.columns]
+
+    return {'term_counts': term_counts.loc[:, valid_groups], 'group_label': group_label or by.capitalize(),
+            'title': f"Trend of {terms} over {by} in {corpus.name}"}
+
+
+def plot_term_counts(term_counts, group_label='Period', title='', ticks=None, tick_labels=None, fig=None):
+    """
+    Plots terms count over successive groups of texts.
+    :param term_counts: (DataFrame) Counts (int), rows are terms and columns are groups in plotting order, e.g.
+        returned from Corpus.term_series().
+    :param group_label: (str) Label of x axis.
+    :param title: (str) Title of the plot.
+    :param ticks: (list) Positions of x ticks. If None, numeric groups themselves.
+    :param tick_labels: (list) Labels of x ticks aligned with ticks. If None, ticks themselves.
+    :param fig: (Figure) Empty figure to draw on. If None, new pyplot figure is created.
     :return: (Figure) Plotted figure.
     """
-    if corpus.name != 'plato_republic':  # Making sure we got plato_republic corpus
-        raise ValueError(f"Invalid Corpus provided. Got: {corpus.name}, Expected: 'plato_republic'")
+    fig, ax = freq_a.subplots((10, 6), fig)
+    groups = list(term_counts.columns)
 
-    # Predefining books indices and figure
-    books = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10']
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    for term in terms:  # For each term in term list
-        valid_books = []  # Books found in the Corpus
-        term_counts = []  # Counts of this term
-        for b in books:
-            for txt_name, tok_txt in corpus.corpus_txts.items():
-                if b in txt_name:  # Making sure we got that book indices within the Corpus
-                    valid_books.append(int(b))
-                    if term in tok_txt.counts:
-                        term_counts.append(tok_txt.counts[term])  # Appending count of specific term from current book
-                    else:
-                        term_counts.append(0)  # If no token found in this book, append 0
-
-        ax.plot(valid_books, term_counts, marker='o', label=f"Cnt of '{term}'")  # Plotting current term
+    for term in term_counts.index:  # For each term in term list
+        ax.plot(groups, term_counts.loc[term, groups], marker='o', label=f"Count of '{term}'")
 
     # Labels, ticks and titles
-    ax.set_xticks([int(b) for b in books])
-    ax.set_xticklabels(books)
-    ax.set_xlabel("Book", fontsize=12)
+    if ticks is not None:
+        ax.set_xticks(ticks)
+    elif all(isinstance(g, (int, float)) for g in groups):  # categorical groups are ticked by matplotlib itself
+        ax.set_xticks(groups)
+    if tick_labels is not None:
+        ax.set_xticklabels(tick_labels)
+    ax.set_xlabel(group_label, fontsize=12)
     ax.set_ylabel("Term Count", fontsize=12)
-    ax.set_title(f"Trend of {terms} over books in {corpus.name}", fontsize=14)
+    ax.set_title(title, fontsize=14)
     ax.grid(True, linestyle='--', alpha=0.7)  # Grid, for better visibility
     ax.legend()
+    fig.tight_layout()
 
     return fig
 
 
-def change_over_time_times(corpus: corp.Corpus, terms):
+def change_over_time(corpus: corp.Corpus, terms, by='period', groups=None, group_label=None):
     """
-    Plots terms count over successive years between 1938 and 1946 within The New York Times Corpus.
+    Plots terms count over successive groups of texts (e.g. years, books) within any Corpus. Groups are taken from
+    metadata field of the Corpus, so no file names are scanned here.
+    :param corpus: (Corpus) Corpus with metadata field 'by'.
+    :param terms: (list) List of terms (str), which will be plotted against successive groups.
+    :param by: (str) Name of metadata field, which defines groups of texts.
+    :param groups: (iterable) Groups to plot, in plotting order. If None, all groups found in the Corpus, sorted.
+    :param group_label: (str) Label of x axis. Defaults to metadata field name.
+    :return: (Figure) Plotted figure.
+    """
+    return plot_term_counts(**change_over_time_args(corpus, terms, by, groups, group_label))
+
+
+def change_over_time_plato_args(corpus: corp.Corpus, terms):
+    """
+    Selects data drawn by change_over_time_plato(), see change_over_time_args().
+    :param corpus: (Corpus) Plato's Republic Corpus.
+    :param terms: (list) List of terms (str), which will be plotted against successive books.
+    :return: (dict) Arguments of plot_term_counts().
+    """
+    if corpus.name != 'plato_republic':  # Making sure we got plato_republic corpus
+        raise ValueError(f"Invalid Corpus provided. Got: {corpus.name}, Expected: 'plato_republic'")
+
+    # Books are numbers ending file names, parsed into 'period' metadata field when the Corpus was created
+    books = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10']
+    args = change_over_time_args(corpus, terms, by='period', groups=range(1, len(books) + 1), group_label="Book")
+    args['ticks'] = [int(b) for b in books]
+    args['tick_labels'] = books
+    args['title'] = f"Trend of {terms} over books in {corpus.name}"
+    return args
+
+
+def change_over_time_plato(corpus: corp.Corpus, terms):
+    """
+    Plots terms count over successive books within Plato's Republic Corpus.
+    :param corpus: (Corpus) Plato's Republic Corpus.
+    :param terms: (list) List of terms (str), which will be plotted against successive books.
+    :return: (Figure) Plotted figure.
+    """
+    return plot_term_counts(**change_over_time_plato_args(corpus, terms))
+
+
+def change_over_time_times_args(corpus: corp.Corpus, terms):
+    """
+    Selects data drawn by change_over_time_times(), see change_over_time_args().
     :param corpus: (Corpus) The New York Times Corpus.
     :param terms:  (list) List of terms (str), which will be plotted against successive years.
-    :return:  (Figure) Plotted figure.
+    :return: (dict) Arguments of plot_term_counts().
     """
     if corpus.name != 'the_times':  # Making sure we got the_times corpus
         raise ValueError(f"Invalid Corpus provided. Got: {corpus.name}, Expected: 'the_times'")
 
-    # Predefining years range and figure
+    # Years are numbers ending file names, parsed into 'period' metadata field when the Corpus was created
     years = range(38, 47)
-    fig, ax = plt.subplots(figsize=(10, 6))
-
-    # Same as in function change_over_time_plato
-    for term in terms:
-        valid_years = []
-        term_counts = []
-        for y in years:
-            for txt_name, tok_txt in corpus.corpus_txts.items():
-                if str(y) in txt_name:
-                    valid_years.append(y)
-                    if term in tok_txt.counts:
-                        term_counts.append(tok_txt.counts[term])
-                    else:
-                        term_counts.append(0)
-        ax.plot(valid_years, term_counts, marker='o', label=f"Count of '{term}'")
+    args = change_over_time_args(corpus, terms, by='period', groups=years, group_label="Year")
+    args['ticks'] = list(years)
+    args['tick_labels'] = list(years)
+    args['title'] = f"Trend of {terms} over years in {corpus.name}"
+    return args
 
-    # Labels, ticks and titles
-    ax.set_xticks(years)
-    ax.set_xticklabels(years)
-    ax.set_xlabel("Year", fontsize=12)
-    ax.set_ylabel("Term Count", fontsize=12)
-    ax.set_title(f"Trend of {terms} over years in {corpus.name}", fontsize=14)
-    ax.grid(True, linestyle='--', alpha=0.7)
-    ax.legend()
-    plt.tight_layout()
 
-    return fig
+def change_over_time_times(corpus: corp.Corpus, terms):
+    """
+    Plots terms count over successive years between 1938 and 1946 within The New York Times Corpus.
+    :param corpus: (Corpus) The New York Times Corpus.
+    :param terms:  (list) List of terms (str), which will be plotted against successive years.
+    :return:  (Figure) Plotted figure.
+    """
+    return plot_term_counts(**change_over_time_times_args(corpus, terms))
@@ -0,0 +1,127 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+import tokenedtext_class as tkn
+from docterm_class import concat_ranges
+from ngram_count import count_ngrams
+
+'''
+This file defines SimilarityIndex class, used for finding texts most similar to a query without computing
+full cosine similarity matrix of the Corpus.
+'''
+
+WEIGHTINGS = ('tf', 'tf_idf')  # available weightings of text vectors
+
+
+class SimilarityIndex:
+    """
+    A class representing inverted index of Corpus texts, for nearest-neighbour search with cosine similarity.
+    Text vectors are normalized to unit length once, so similarity of a query to every text is a sum over postings
+    of query terms only.
+
+    Attributes:
+        corpus (Corpus) : indexed Corpus
+        weighting (str) : 'tf' (term frequencies) or 'tf_idf' (TF-IDF values) as vector components
+        idf (ndarray) : inverse document frequency of every token of the Corpus, None for 'tf' weighting
+        term_ptr (ndarray) : postings of token t are cells term_ptr[t]:term_ptr[t+1] of doc_ids and weights
+        doc_ids (ndarray) : ids of texts (int32) within postings
+        weights (ndarray) : components (float) of unit-length text vectors within postings
+    """
+
+    def __init__(self, corpus, weighting='tf_idf'):
+        """
+        Constructor for SimilarityIndex class.
+        :param corpus: (Corpus) Corpus to index.
+        :param weighting: (str) 'tf' or 'tf_idf'.
+        """
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Invalid weighting provided. Got: {weighting}, Expected one of: {WEIGHTINGS}")
+        self.corpus = corpus
+        self.weighting = weighting
+
+        dtm = corpus.dtm
+        if weighting == 'tf_idf':
+            self.idf = dtm.idf()
+            vals = dtm.tf_idf().data
+        else:
+            self.idf = None
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vals = dtm.data / dtm.doc_lengths[dtm.row_ids()]
+
+        # Normalize text vectors to unit length, texts with empty vectors are left with zeros
+        norms = np.sqrt(np.bincount(dtm.row_ids(), weights=vals ** 2, minlength=dtm.n_docs))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vals = np.nan_to_num(vals / norms[dtm.row_ids()])
+
+        self.term_ptr, self.doc_ids, self.weights = dtm.to_csc(vals)
+
+    def _query_vector(self, query):
+        """
+        Converts query into ids of Corpus tokens and unit-length vector components, weighted as indexed texts.
+        :param query: (str) Name of the text within Corpus or raw text, (TokenedText) or (dict) of counts.
+        :return term_ids: (ndarray) Ids of query tokens known to the Corpus.
+        :return weights: (ndarray) Components of query vector aligned with term_ids.
+        """
+        dtm = self.corpus.dtm
+        if isinstance(query, str) and query in self.corpus.corpus_txts:  # text of the Corpus - take its dtm row
+            i = self.corpus.txt_names.index(query)
+            start, stop = dtm.indptr[i], dtm.indptr[i + 1]
+            term_ids = dtm.indices[start:stop].astype(np.int64)
+            weights = dtm.data[start:stop] / max(dtm.doc_lengths[i], 1)
+        else:
+            if isinstance(query, tkn.TokenedText):
+                counts = query.counts
+            elif isinstance(query, dict):
+                counts = query
+            else:  # raw text, cleaned, tokenized and counted the same way as texts of the Corpus
+                params = self.corpus._tok_params
+                tokens = tkn.TokenedText.tokenize(tkn.TokenedText.clean_char(query),
+                                                  params['tokenizer'], params['token_filter'])
+                if self.corpus.ngram > 1:
+                    terms, _, token_ids = tkn.TokenedText._encode_tokens(tokens)
+                    ngrams, ngram_counts = count_ngrams(terms, token_ids, self.corpus.ngram, min_count=1)
+                    counts = dict(zip(ngrams, ngram_counts.tolist()))
+                else:
+                    counts = Counter(tokens)
+
+            known = [(dtm.vocab_ids[t], c) for t, c in counts.items() if t in dtm.vocab_ids]  # unknown add nothing
+            term_ids = np.array([t for t, _ in known], dtype=np.int64)
+            weights = np.array([c for _, c in known], dtype=np.float64) / max(sum(counts.values()), 1)
+
+        if self.idf is not None:
+            weights *= self.idf[term_ids]
+
+        norm = np.linalg.norm(weights)
+        return term_ids, (weights / norm if norm > 0 else weights)
+
+    def most_similar(self, query, k=10, exclude_self=True):
+        """
+        Finds k texts of the Corpus most similar (cosine similarity) to the query.
+        :param query: (str) Name of the text within Corpus or raw text, (TokenedText) or (dict) of counts.
+        :param k: (int) Number of returned texts.
+        :param exclude_self: (bool) If query is a name of the text within Corpus, leave this text out of results.
+        :return: (Series) Cosine similarities (float) indexed by text names, from the most similar.
+        """
+        term_ids, q_weights = self._query_vector(query)
+
+        # Gather postings of all query terms at once
+        cells = concat_ranges(self.term_ptr[term_ids], self.term_ptr[term_ids + 1])
+        lens = self.term_ptr[term_ids + 1] - self.term_ptr[term_ids]
+
+        n_docs = self.corpus.dtm.n_docs
+        scores = np.bincount(self.doc_ids[cells], weights=self.weights[cells] * np.repeat(q_weights, lens),
+                             minlength=n_docs)
+
+        names = self.corpus.txt_names
+        candidates = np.arange(n_docs)
+        if exclude_self and isinstance(query, str) and query in self.corpus.corpus_txts:
+            candidates = candidates[candidates != names.index(query)]
+
+        # Partial selection of k best texts, only those are sorted
+        k = min(k, len(candidates))
+        if k <= 0:
+            return pd.Series(dtype=float)
+        best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return pd.Series(scores[best], index=[names[i] for i in best])
@@ -0,0 +1,261 @@
+import math
+import zlib
+import heapq
+import numpy as np
+
+'''
+This file defines classes for approximate counting of terms in fixed memory, independent of the vocabulary size:
+    - Sketcher : settings and hash functions shared by all sketches which are merged together.
+    - FrequencySketch : Count-Min Sketch of all terms combined with Space-Saving summary of the k most frequent ones.
+Sketches of different texts (or of texts counted in different processes) are merged by merge().
+
+Error bounds, for N counted terms in total (also after merging):
+    - Count-Min Sketch of width w = e / epsilon and depth d = ln(1 / delta) never underestimates a count, and
+      overestimates it by more than epsilon * N with probability at most delta.
+    - Space-Saving summary of k terms never underestimates a count of a monitored term and overestimates it by at most
+      N / k (the 'error' of the term, see FrequencySketch.most_common()). Every term occurring more than N / k times is
+      monitored.
+Reported counts are the smaller of both estimates, so both bounds hold for them.
+'''
+
+
+def _term_hashes(terms):
+    """
+    32-bit hashes of terms, stable across processes and runs (unlike built-in hash()).
+    :param terms: (list) Terms (str).
+    :return: (ndarray) Hashes (uint64).
+    """
+    return np.fromiter((zlib.crc32(term.encode('utf-8')) for term in terms), dtype=np.uint64, count=len(terms))
+
+
+class Sketcher:
+    """
+    A class holding settings and hash functions of FrequencySketch. Only sketches created by the same Sketcher (or by
+    Sketchers with equal settings) can be merged.
+
+    Attributes:
+        k (int) : Number of terms monitored by Space-Saving summary.
+        epsilon (float) : Relative error of Count-Min Sketch, as a fraction of all counted terms.
+        delta (float) : Probability of exceeding the error.
+        seed (int) : Seed of hash functions.
+        width (int) : Number of counters in every row of Count-Min Sketch (power of 2, at least e / epsilon).
+        depth (int) : Number of rows of Count-Min Sketch (at least ln(1 / delta)).
+    """
+
+    def __init__(self, k=1000, epsilon=1e-3, delta=1e-2, seed=1):
+        """
+        Constructor for Sketcher class. Memory of every sketch is about 8 * width * depth + 100 * k bytes, e.g. 200 kB
+        with default settings.
+        :param k: (int) Number of most frequent terms kept with their counts.
+        :param epsilon: (float) Relative error of counts, between 0 and 1.
+        :param delta: (float) Probability of exceeding the error, between 0 and 1.
+        :param seed: (int) Seed of hash functions.
+        """
+        if k < 1 or not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"Invalid Sketcher settings provided. Got: k={k}, epsilon={epsilon}, delta={delta}, "
+                             f"Expected: positive k, epsilon and delta between 0 and 1")
+        self.k = k
+        self.epsilon = epsilon
+        self.delta = delta
+        self.seed = seed
+        self._bits = max(math.ceil(math.log2(math.e / epsilon)), 1)
+        self.width = 1 << self._bits
+        self.depth = max(math.ceil(math.log(1 / delta)), 1)
+
+        # Multiply-shift hash of every row h(x) = ((a * x + b) mod 2^64) >> (64 - bits) with odd a
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 64, size=self.depth, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 1 << 64, size=self.depth, dtype=np.uint64)
+
+    @property
+    def settings(self):
+        """
+        Settings defining the Sketcher, equal settings give equal hash functions.
+        :return: (dict)
+        """
+        return {'k': self.k, 'epsilon': self.epsilon, 'delta': self.delta, 'seed': self.seed}
+
+    def sketch(self):
+        """
+        Creates empty FrequencySketch.
+        :return: (FrequencySketch)
+        """
+        return FrequencySketch(self)
+
+    def _columns(self, hashes):
+        """
+        Counter of every term within every row of Count-Min Sketch.
+        :param hashes: (ndarray) Hashes of terms (uint64).
+        :return: (ndarray) shape (depth, n_terms) of column ids (int64).
+        """
+        cols = self._a[:, None] * hashes[None, :] + self._b[:, None]  # uint64 arithmetic wraps around
+        return (cols >> np.uint64(64 - self._bits)).astype(np.int64)
+
+
+class FrequencySketch:
+    """
+    A class counting terms approximately in fixed memory: Count-Min Sketch estimates count of any term and
+    Space-Saving summary keeps the k most frequent terms (heavy hitters). See module description for error bounds.
+
+    Attributes:
+        sketcher (Sketcher) : Settings and hash functions.
+        total (int) : Number of all counted terms (N), exact.
+        table (ndarray) : Count-Min Sketch counters (int64), shape (depth, width).
+    """
+
+    def __init__(self, sketcher: Sketcher):
+        """
+        Constructor for FrequencySketch class.
+        :param sketcher: (Sketcher) Settings and hash functions.
+        """
+        self.sketcher = sketcher
+        self.total = 0
+        self.table = np.zeros((sketcher.depth, sketcher.width), dtype=np.int64)
+        self._monitored = {}  # Space-Saving counters: terms (str) as keys and lists [count, error] as values
+        self._heap = []  # (count, term) of every monitored term, count may be stale (lower than actual)
+
+    def update(self, terms, counts=None):
+        """
+        Counts a batch of terms.
+        :param terms: (list) Terms (str). Repeated terms are counted as many times as they occur.
+        :param counts: (ndarray) Counts (int) aligned with terms. If None, every term is counted once.
+        """
+        counts = np.ones(len(terms), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        if not len(terms):
+            return
+        cols = self.sketcher._columns(_term_hashes(terms))
+        for row, row_cols in zip(self.table, cols):
+            row += np.bincount(row_cols, weights=counts, minlength=self.sketcher.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+        for term, cnt in zip(terms, counts.tolist()):
+            self._monitor(term, cnt)
+
+    def _monitor(self, term: str, cnt: int):
+        """
+        Space-Saving update of single term: monitored term is incremented, new term takes place of the least
+        frequent one and inherits its count as error.
+        :param term: (str) Term.
+        :param cnt: (int) Count of the term.
+        """
+        entry = self._monitored.get(term)
+        if entry is not None:
+            entry[0] += cnt  # heap entry becomes stale, it is refreshed when it reaches the top
+        elif len(self._monitored) < self.sketcher.k:
+            self._monitored[term] = [cnt, 0]
+            heapq.heappush(self._heap, (cnt, term))
+        else:
+            heap, monitored = self._heap, self._monitored
+            while heap[0][0] != monitored[heap[0][1]][0]:  # refresh stale entries until the true minimum is on top
+                heapq.heapreplace(heap, (monitored[heap[0][1]][0], heap[0][1]))
+            min_cnt, evicted = heap[0]
+            del monitored[evicted]
+            monitored[term] = [min_cnt + cnt, min_cnt]
+            heapq.heapreplace(heap, (min_cnt + cnt, term))
+
+    def merge(self, other):
+        """
+        Adds counts of another sketch to this one, as if all terms of both were counted by single sketch.
+        :param other: (FrequencySketch) Sketch created with equal settings.
+        :return: (FrequencySketch) self
+        """
+        if other.sketcher.settings != self.sketcher.settings:
+            raise ValueError(f"Sketches with different settings cannot be merged. Got: {other.sketcher.settings}, "
+                             f"Expected: {self.sketcher.settings}")
+        self.table += other.table
+        self.total += other.total
+
+        # Term missing from a full summary occurs at most as many times as its least frequent monitored term
+        own_min, other_min = self._min_count(), other._min_count()
+        merged = {term: [cnt + other_min, err + other_min] for term, (cnt, err) in self._monitored.items()}
+        for term, (cnt, err) in other._monitored.items():
+            if term in merged:
+                merged[term][0] += cnt - other_min
+                merged[term][1] += err - other_min
+            else:
+                merged[term] = [cnt + own_min, err + own_min]
+
+        kept = heapq.nlargest(self.sketcher.k, merged.items(), key=lambda item: item[1][0])
+        self._monitored = dict(kept)
+        self._heap = [(cnt, term) for term, (cnt, _) in kept]
+        heapq.heapify(self._heap)
+        return self
+
+    def _min_count(self):
+        """
+        Smallest count within Space-Saving summary if it is full, upper bound of counts of terms it does not monitor.
+        :return: (int)
+        """
+        if len(self._monitored) < self.sketcher.k:
+            return 0
+        return min(cnt for cnt, _ in self._monitored.values())
+
+    def estimate(self, terms):
+        """
+        Count-Min estimates of counts of any terms, never lower than true counts.
+        :param terms: (list) Terms (str).
+        :return: (ndarray) Estimated counts (int64) aligned with terms.
+        """
+        cols = self.sketcher._columns(_term_hashes(terms))
+        return np.take_along_axis(self.table, cols, axis=1).min(axis=0) if len(terms) else np.zeros(0, np.int64)
+
+    def most_common(self, n=None, with_errors=False):
+        """
+        n most frequent terms, taken from Space-Saving summary.
+        :param n: (int) Number of terms, at most k. If None, all monitored terms are returned.
+        :param with_errors: (bool) If True, maximal overestimation of every count is returned as well (guaranteed,
+            at most N / k).
+        :return: (dict) Terms (str) as keys and estimated counts (int) as values, from the most frequent.
+            With with_errors, values are tuples of estimated count (int) and its maximal error (int).
+        """
+        terms = list(self._monitored)
+        space_saving = np.fromiter((cnt for cnt, _ in self._monitored.values()), dtype=np.int64, count=len(terms))
+        counts = np.minimum(space_saving, self.estimate(terms))  # both are upper bounds, the smaller one is closer
+        order = np.argsort(-counts, kind='stable')[:n]
+        if not with_errors:
+            return {terms[i]: cnt for i, cnt in zip(order.tolist(), counts[order].tolist())}
+        # True count is at least Space-Saving count minus its error, whichever estimate was reported
+        errors = (counts - space_saving + np.fromiter((err for _, err in self._monitored.values()), dtype=np.int64,
+                                                      count=len(terms)))[order].tolist()
+        return {terms[i]: (cnt, err) for i, cnt, err in zip(order.tolist(), counts[order].tolist(), errors)}
+
+    def save(self, path: str):
+        """
+        Writes the sketch into *.npz file: counters, total and Space-Saving summary (terms as single utf-8 blob).
+        :param path: (str) Path to *.npz file.
+        """
+        terms = list(self._monitored)
+        summary = np.array(list(self._monitored.values()), dtype=np.int64).reshape(len(terms), 2)
+        blob = '\n'.join(terms).encode('utf-8')  # terms never contain newlines
+        np.savez(path, table=self.table, total=np.int64(self.total), summary=summary,
+                 terms=np.frombuffer(blob, dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path: str, sketcher: Sketcher):
+        """
+        Reads the sketch written by save().
+        :param path: (str) Path to *.npz file.
+        :param sketcher: (Sketcher) Sketcher with the same settings as the one of saved sketch.
+        :return: (FrequencySketch)
+        """
+        sketch = cls(sketcher)
+        with np.load(path) as arrays:
+            if arrays['table'].shape != sketch.table.shape:
+                raise ValueError(f"Invalid sketch file provided. Got table shape: {arrays['table'].shape}, "
+                                 f"Expected: {sketch.table.shape}")
+            sketch.table = arrays['table']
+            sketch.total = int(arrays['total'])
+            blob = arrays['terms'].tobytes()
+            terms = blob.decode('utf-8').split('\n') if blob else []
+            sketch._monitored = {term: [cnt, err] for term, (cnt, err) in zip(terms, arrays['summary'].tolist())}
+        sketch._heap = [(cnt, term) for term, (cnt, _) in sketch._monitored.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+    def error_bound(self):
+        """
+        Maximal overestimation of counts: epsilon * N for Count-Min estimates (exceeded with probability at most
+        delta) and N / k for terms of Space-Saving summary (always).
+        :return: (tuple) of (float) Count-Min bound and (float) Space-Saving bound.
+        """
+        return self.sketcher.epsilon * self.total, self.total / self.sketcher.k
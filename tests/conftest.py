@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repository root
+
+'''
+Shared settings of tests: modules of the repository are imported from its root, as in the notebooks.
+'''
+
+EXEMPLAR_TEXTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'exemplar_texts')
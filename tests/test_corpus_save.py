@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+import corpus_class as corp
+from conftest import EXEMPLAR_TEXTS
+
+'''
+Checks that Corpus written by save() and opened by load() keeps its document-term matrix.
+'''
+
+
+def _assert_same_dtm(dtm, expected):
+    assert dtm.vocab == expected.vocab
+    for attr in ('indptr', 'indices', 'data', 'term_totals', 'doc_freqs', 'doc_lengths'):
+        np.testing.assert_array_equal(getattr(dtm, attr), getattr(expected, attr))
+
+
+def test_save_into_folder_it_was_loaded_from(tmp_path):
+    corpus = corp.Corpus(os.path.join(EXEMPLAR_TEXTS, 'plato_republic'), tokenizer='fast')
+    path = str(tmp_path / 'corpus')
+    corpus.save(path)
+
+    loaded = corp.Corpus.load(path)  # dtm arrays are memory-mapped from the files written over below
+    loaded.save(path)
+    _assert_same_dtm(loaded.dtm, corpus.dtm)
+    _assert_same_dtm(corp.Corpus.load(path).dtm, corpus.dtm)
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+import tokenedtext_class as tkn
+from conftest import EXEMPLAR_TEXTS
+
+'''
+Checks that 'fast' tokenizer backend of TokenedText returns exactly the same tokens as 'nltk' backend.
+'''
+
+TXT_PATHS = sorted(os.path.join(root, file_name) for root, _, file_names in os.walk(EXEMPLAR_TEXTS)
+                   for file_name in file_names if file_name.endswith('.txt'))
+
+
+@pytest.mark.parametrize('txt_path', TXT_PATHS, ids=lambda path: os.path.relpath(path, EXEMPLAR_TEXTS))
+def test_fast_tokenizer_matches_nltk(txt_path):
+    content = tkn.TokenedText.clean_char(tkn.TokenedText.load_txt(txt_path))
+    assert tkn.TokenedText.tokenize(content, 'fast') == tkn.TokenedText.tokenize(content, 'nltk')
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+'''
+This file contains functions for persistent on-disk cache of tokenized *.txt files.
+Each entry is keyed by content hash of the *.txt file combined with digest of tokenizer settings, so changing either
+the file or the settings automatically points to a different entry.
+Functions:
+    - cache_key()
+    - load_tokens()
+    - save_tokens()
+    - load_signature()
+    - save_signature()
+MinHash signatures are kept next to the entries, one file per MinHasher settings, so they can be added to entries
+saved before.
+'''
+
+CACHE_VERSION = 1  # bump when layout of cache entries changes
+_READ_BLOCK = 1 << 20  # files are hashed in blocks of 1 MB
+
+
+def cache_key(txt_path: str, settings_digest: str):
+    """
+    Computes cache key of *.txt file: hash of its content combined with tokenizer settings.
+    :param txt_path: (str) Path to *.txt file.
+    :param settings_digest: (str) Digest of tokenizer settings (stopwords, min length, regex...).
+    :return: (str) Hexadecimal key.
+    """
+    h = hashlib.sha256(f'{CACHE_VERSION}:{settings_digest}:'.encode('utf-8'))
+    with open(txt_path, 'rb') as file:
+        for block in iter(lambda: file.read(_READ_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _entry_path(cache_dir: str, key: str):
+    """
+    Path to cache entry file for given key.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :return: (str)
+    """
+    return os.path.join(cache_dir, f'{key}.npz')
+
+
+def load_tokens(cache_dir: str, key: str, with_tokens=True):
+    """
+    Loads terms, counts and token sequence of a text from the cache.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :param with_tokens: (bool) If False, only terms and counts are loaded and token ids are returned as None.
+    :return: (tuple) of terms (list), counts (ndarray) aligned with terms and token ids (ndarray) - positions of
+        successive tokens within terms, or None if there is no entry for the key.
+        Token ids are None also when the entry was saved without them (streamed text).
+    """
+    path = _entry_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+
+    with np.load(path) as entry:
+        blob = entry['vocab'].tobytes()
+        terms = blob.decode('utf-8').split('\n') if blob else []  # terms never contain whitespace
+        counts = entry['counts']
+        token_ids = entry['ids'] if with_tokens and 'ids' in entry.files else None
+    return terms, counts, token_ids
+
+
+def save_tokens(cache_dir: str, key: str, terms: list, counts, token_ids=None):
+    """
+    Saves terms, counts and token sequence of a text into the cache. Terms are stored as single utf-8 blob, counts and
+    token sequence as int32 arrays.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :param terms: (list) Unique tokens (str) within the text.
+    :param counts: (ndarray) Counts (int) aligned with terms.
+    :param token_ids: (ndarray) Positions of successive tokens within terms (int). None if only counts are known
+        (streamed text).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    blob = '\n'.join(terms).encode('utf-8')
+    arrays = {'vocab': np.frombuffer(blob, dtype=np.uint8), 'counts': np.asarray(counts, dtype=np.int32)}
+    if token_ids is not None:
+        arrays['ids'] = np.asarray(token_ids, dtype=np.int32)
+
+    # Write into temporary file first, so concurrent readers never see partially written entry
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, _entry_path(cache_dir, key))
+
+
+def _signature_path(cache_dir: str, key: str, hasher_digest: str):
+    """
+    Path to signature file for given key and MinHasher settings.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :param hasher_digest: (str) Digest of MinHasher settings.
+    :return: (str)
+    """
+    return os.path.join(cache_dir, f'{key}.{hasher_digest[:16]}.sig.npy')
+
+
+def load_signature(cache_dir: str, key: str, hasher_digest: str):
+    """
+    Loads MinHash signature of a text from the cache.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :param hasher_digest: (str) Digest of MinHasher settings.
+    :return: (ndarray) Signature (uint64), or None if it was not saved.
+    """
+    path = _signature_path(cache_dir, key, hasher_digest)
+    if not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def save_signature(cache_dir: str, key: str, hasher_digest: str, signature):
+    """
+    Saves MinHash signature of a text into the cache.
+    :param cache_dir: (str) Path to cache directory.
+    :param key: (str) Key returned from cache_key().
+    :param hasher_digest: (str) Digest of MinHasher settings.
+    :param signature: (ndarray) Signature (uint64).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        np.save(file, np.asarray(signature, dtype=np.uint64))
+    os.replace(tmp_path, _signature_path(cache_dir, key, hasher_digest))
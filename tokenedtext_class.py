@@ -1,55 +1,402 @@
 import re
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import nltk
+import sys
+import json
+import hashlib
+from itertools import islice
+from functools import lru_cache
 from collections import Counter
+import numpy as np
+
+import token_cache
+import ngram_count
+from profiler import NULL_PROFILER
+from docterm_class import top_ids
 
 '''
 This file defines TokenedText class, datatype meant to store tokenized content of given *.txt file.
 '''
 
 
-# These are required for tokenize to work
-nltk.download('punkt')
-nltk.download('punkt_tab')
-nltk.download("stopwords")
+# nltk data required for tokenize to work - loaded lazily by load_nltk(), so importing this file is cheap
+NLTK_RESOURCES = {'punkt_tab': 'tokenizers/punkt_tab', 'stopwords': 'corpora/stopwords'}
+
+# Tokenizer settings, which are also part of token cache keys
+CLEAN_PATTERN = r"[^a-zA-Z\s]"  # everything apart from a-z, A-Z and whitespaces is dropped
+MIN_TOKEN_LEN = 3  # shorter tokens are dropped
+STOPWORDS_LANG = "english"  # language of nltk stop-words list
+
+TOKENIZERS = ('nltk', 'fast')  # available tokenizer backends, see TokenedText.tokenize()
+# Words split by nltk word_tokenize even after cleaning (MacIntyre contractions without apostrophes)
+_SPLIT_WORDS = {'cannot': ('can', 'not'), 'gimme': ('gim', 'me'), 'gonna': ('gon', 'na'),
+                'gotta': ('got', 'ta'), 'lemme': ('lem', 'me'), 'wanna': ('wan', 'na')}
+
+STREAM_CHUNK_SIZE = 1 << 20  # number of characters read at once in streaming mode
+_TRAILING_WORD = re.compile(r"\S*\Z")  # last word of a chunk, which may continue in the next chunk
+STREAM_BLOCK = 1 << 16  # number of streamed tokens counted (as n-grams, in sketch) and added to signature at once
+
+
+@lru_cache(maxsize=None)
+def load_nltk(package: str):
+    """
+    Imports nltk and makes sure that its data package is available. Local nltk data is checked first, so network is
+    used only when the package is missing. Runs at most once per package in a process.
+    :param package: (str) nltk data package, one of NLTK_RESOURCES keys.
+    :return: (module) nltk
+    """
+    import nltk  # importing nltk itself takes a while, so it is deferred until first tokenization
+
+    try:
+        nltk.data.find(NLTK_RESOURCES[package])
+    except LookupError:
+        nltk.download(package, quiet=True)
+    return nltk
+
+
+def tokenizer_settings_digest(tokenizer='nltk', token_filter=None):
+    """
+    Digest of all settings which influence tokenization result.
+    :param tokenizer: (str) Tokenizer backend, one of TOKENIZERS.
+    :param token_filter: (TokenFilter) Filter applied to tokens. Defaults to default_filter().
+    :return: (str) Hexadecimal digest.
+    """
+    token_filter = default_filter() if token_filter is None else token_filter
+    settings = {'tokenizer': tokenizer,
+                'clean_pattern': CLEAN_PATTERN,
+                'filter': token_filter.digest}
+    return hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()
+
+
+class TokenFilter:
+    """
+    A class for dropping unwanted tokens, with stop-words set and all settings precomputed once, so a single filter
+    can be shared by all texts of a corpus (and sent to worker processes instead of loading stop-words there).
+
+    Attributes:
+        stop_words (frozenset) : Tokens (str) which are dropped.
+        min_len (int) : Tokens shorter than that are dropped.
+        split_words (dict) : Words (str) split further by nltk word_tokenize, with their filtered parts (tuple).
+        digest (str) : Digest of filter settings, part of token cache keys.
+    """
+
+    def __init__(self, min_len=MIN_TOKEN_LEN, stopwords_lang=STOPWORDS_LANG, extra_stop_words=(), keep_words=()):
+        """
+        Constructor for TokenFilter class.
+        :param min_len: (int) Minimal length of kept tokens.
+        :param stopwords_lang: (str) Language of nltk stop-words list. If None, nltk list is not used.
+        :param extra_stop_words: (iterable) Custom stop-words (str), added to nltk list.
+        :param keep_words: (iterable) Words (str) which are never treated as stop-words.
+        """
+        # Drop common stop words using nltk - this lib has pretty conservative set of stop-words
+        nltk_words = load_nltk('stopwords').corpus.stopwords.words(stopwords_lang) if stopwords_lang else []
+        self.stop_words = frozenset((set(nltk_words) | set(extra_stop_words)) - set(keep_words))
+        self.min_len = min_len
+        self.split_words = {wrd: tuple(self(parts)) for wrd, parts in _SPLIT_WORDS.items()}
+
+        settings = {'min_len': min_len, 'stop_words': sorted(self.stop_words)}
+        self.digest = hashlib.sha256(json.dumps(settings).encode('utf-8')).hexdigest()
+
+    def __call__(self, tokens):
+        """
+        Filters tokens in a single pass.
+        :param tokens: (iterable) Tokens (str).
+        :return: (list) Tokens (str) which are not stop-words and are long enough.
+        """
+        stop_words, min_len = self.stop_words, self.min_len
+        return [tk for tk in tokens if tk not in stop_words and len(tk) >= min_len]
+
+
+@lru_cache(maxsize=None)
+def default_filter():
+    """
+    Filter with default settings (nltk english stop-words, MIN_TOKEN_LEN), created once per process.
+    :return: (TokenFilter)
+    """
+    return TokenFilter()
 
 
 class TokenedText:
     """
     A class for representing *.txt files in properly cleaned and tokenized datatype.
+    Counts are kept as two parallel arrays (terms and their counts) and tokens, if kept at all, as int32 ids into terms,
+    so a text takes a fraction of memory of lists and dicts of str. Terms are interned, so texts share them.
 
     Attributes:
         name (str) : name of *.txt file on which TokenedText is based
-        tokens (list) : List of unique tokens (str) within the text.
-        n_words (int) : Number of unique tokens within the text.
-        counts (dict) : Tokens (str) as keys and their respective counts (int) as values.
+        terms (list) : Unique tokens (str) within the text, in order of first occurrence (not sorted by count).
+        term_counts (ndarray) : Counts (int32) of terms, aligned with terms.
+        token_ids (ndarray) : Positions of successive tokens of the text within terms (int32). None if tokens
+            were not kept (keep_tokens=False, streamed text, n-grams or pruned counts).
+        n_words (int) : Number of tokens (n-grams) within the text, including the ones dropped by min_count.
+        ngram (int) : Number of successive tokens in every term - 1 for words, 2 for bigrams (e.g. "prime minister")...
+        sketch (FrequencySketch) : Approximate counts of all terms in fixed memory (see sketch_class), None if the text
+            was counted exactly. terms and term_counts hold only its k most frequent terms then.
+        tokens (list) : List of tokens (str) within the text, decoded from token_ids. None if tokens were not kept.
+        counts (dict) : Tokens (str) as keys and their respective counts (int) as values, built from terms and
+            term_counts. See most_common() for the most frequent ones.
+        signature (ndarray) : MinHash signature of shingles of tokens (see minhash_class), None if no MinHasher was
+            given.
     """
+    __slots__ = ('name', 'terms', 'term_counts', 'token_ids', 'n_words', 'ngram', 'signature', 'sketch', '_top',
+                 '_counts')
 
-    def __init__(self, txt_path: str, name='_'):
+    def __init__(self, txt_path: str, name='_', cache_dir=None, stream=False, chunk_size=STREAM_CHUNK_SIZE,
+                 tokenizer='nltk', token_filter=None, keep_tokens=True, ngram=1, min_count=None, minhasher=None,
+                 sketcher=None, profiler=None):
         """
         Constructor for TokenedText class.
         :param txt_path: (str) Path to *.txt file.
         :param name: (str) Identification name of TokenedText
+        :param cache_dir: (str) Path to token cache directory. If given, tokens and counts are loaded from the cache
+            when neither the file nor tokenizer settings changed, and saved into it otherwise.
+        :param stream: (bool) If True, the file is read, cleaned and tokenized chunk by chunk and only the counts are
+            kept, so memory does not grow with the file size. tokens attribute is None then.
+        :param chunk_size: (int) Number of characters read at once in streaming mode.
+        :param tokenizer: (str) Tokenizer backend: 'nltk' (word_tokenize) or 'fast' (single split pass, same tokens).
+        :param token_filter: (TokenFilter) Stop-words and min length filter. Defaults to default_filter().
+        :param keep_tokens: (bool) If False, sequence of tokens is dropped after counting and only counts are kept.
+        :param ngram: (int) If larger than 1, n-grams of that many successive tokens are counted instead of single
+            tokens (see ngram_count), and terms are tokens joined with a space. Token cache still holds single tokens.
+        :param min_count: (int) Terms occurring fewer times within the text are dropped, which bounds the number of
+            rare n-grams kept in memory. Defaults to 1 for single tokens and ngram_count.NGRAM_MIN_COUNT for n-grams.
+            Streamed n-grams are counted in bounded memory, so counts of texts with very many distinct n-grams may be
+            slightly underestimated (see ngram_count.NGramCounter).
+        :param minhasher: (MinHasher) If given, MinHash signature of the text is computed from its tokens (also in
+            streaming mode) and kept in the token cache, next to the tokens.
+        :param sketcher: (Sketcher) If given, the text is streamed and counted approximately in fixed memory, into
+            FrequencySketch (sketch attribute), whatever its vocabulary. Token cache is not used then.
+        :param profiler: (Profiler) Records time of every stage (cache_load, load_txt, clean_char, tokenize, filter,
+            count, minhash, ngrams, cache_save, stream or sketch) and numbers of tokens and terms of the text. None to
+            record nothing.
         """
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f"Invalid tokenizer provided. Got: {tokenizer}, Expected one of: {TOKENIZERS}")
+        min_count = ngram_count.default_min_count(ngram, min_count)
+        if ngram < 1 or min_count < 1:
+            raise ValueError(f"Invalid n-gram settings provided. Got: ngram={ngram}, min_count={min_count}, "
+                             f"Expected: positive integers")
         self.name = name
+        self.ngram = ngram
+        token_filter = default_filter() if token_filter is None else token_filter
+        keep_tokens = keep_tokens and not stream and sketcher is None  # streamed text never has its tokens
+
+        profiler = NULL_PROFILER if profiler is None else profiler
+
+        with profiler.document(name):
+            signature = cached = sketch = n_words = None
+            with profiler.stage('cache_load'):
+                digest = tokenizer_settings_digest(tokenizer, token_filter)
+                key = token_cache.cache_key(txt_path, digest) if cache_dir is not None and sketcher is None else None
+                if key is not None and minhasher is not None:
+                    signature = token_cache.load_signature(cache_dir, key, minhasher.digest)
+                # n-grams and missing signature are computed from cached tokens, so they are needed as well
+                need_tokens = keep_tokens or ngram > 1 or (minhasher is not None and signature is None)
+                if key is not None:
+                    cached = token_cache.load_tokens(cache_dir, key, with_tokens=need_tokens)
+
+            if cached is not None and (not need_tokens or cached[2] is not None):  # streamed entries have no tokens
+                terms, term_counts, token_ids = cached
+                if minhasher is not None and signature is None:
+                    with profiler.stage('minhash'):
+                        signature = minhasher.encoded_signature(terms, token_ids)
+                    with profiler.stage('cache_save'):
+                        token_cache.save_signature(cache_dir, key, minhasher.digest, signature)
+            elif sketcher is not None:
+                # Text is streamed and counted approximately, so memory is fixed whatever the vocabulary
+                with profiler.stage('sketch'):
+                    sketch, signature = self._sketch_tokens(
+                        self.stream_tokens(txt_path, chunk_size, tokenizer, token_filter), sketcher, ngram, minhasher)
+                    terms, term_counts = self._count_arrays(sketch.most_common())
+                    token_ids = None
+            elif stream:
+                # Reading, cleaning, tokenizing and counting are interleaved, tokens are never kept
+                with profiler.stage('stream'):
+                    tokens = self.stream_tokens(txt_path, chunk_size, tokenizer, token_filter)
+                    if minhasher is None and ngram == 1:
+                        terms, term_counts = self._count_arrays(Counter(tokens))
+                    else:  # blocks of tokens are counted and added to signature, n-grams spanning blocks included
+                        counter = ngram_count.NGramCounter(ngram)
+                        minhash = minhasher.minhash() if minhasher is not None else None
+                        for block in iter(lambda: list(islice(tokens, STREAM_BLOCK)), []):
+                            counter.update(block)
+                            if minhash is not None:
+                                minhash.update(block)
+                        terms, term_counts = counter.arrays(min_count)
+                        n_words = counter.total  # dropped n-grams included
+                        signature = minhash.signature() if minhash is not None else None
+                    token_ids = None
 
-        raw_content = self.load_txt(txt_path)  # loading content of the file
-        content = self.clean_char(raw_content)  # using RegEx to clean the content
+                if key is not None and ngram == 1 and min_count == 1:  # cache holds only unpruned single tokens
+                    with profiler.stage('cache_save'):
+                        token_cache.save_tokens(cache_dir, key, terms, term_counts)
+                        if signature is not None:
+                            token_cache.save_signature(cache_dir, key, minhasher.digest, signature)
+            else:
+                with profiler.stage('load_txt'):
+                    raw_content = self.load_txt(txt_path)  # loading content of the file
+                with profiler.stage('clean_char'):
+                    content = self.clean_char(raw_content)  # using RegEx to clean the content
 
-        self.tokens = self.tokenize(content)  # tokenizing clean content
-        self.n_words = len(self.tokens)  # number of words within the text
+                tokens = self.tokenize(content, tokenizer, token_filter, profiler)  # tokenizing clean content
+                with profiler.stage('count'):
+                    terms, term_counts, token_ids = self._encode_tokens(tokens)  # counting occurrences of unique tokens
+                if minhasher is not None:
+                    with profiler.stage('minhash'):
+                        signature = minhasher.encoded_signature(terms, token_ids)
 
-        self.counts = self.words_count()  # counting occurrences of unique tokens
+                if key is not None:
+                    with profiler.stage('cache_save'):
+                        token_cache.save_tokens(cache_dir, key, terms, term_counts, token_ids)
+                        if signature is not None:
+                            token_cache.save_signature(cache_dir, key, minhasher.digest, signature)
+
+            # number of words (n-grams) within the text, taken before rare terms are dropped, sketch knows it exactly
+            if sketch is not None:
+                n_words = sketch.total
+            elif ngram > 1 and token_ids is not None:
+                n_words = max(len(token_ids) - ngram + 1, 0)
+            elif n_words is None:
+                n_words = int(np.sum(term_counts))
+
+            if ngram > 1 and token_ids is not None:  # streamed text has its n-grams counted already
+                with profiler.stage('ngrams'):
+                    terms, term_counts = ngram_count.count_ngrams(terms, token_ids, ngram, min_count)
+                keep_tokens = False
+            elif min_count > 1:
+                kept = np.asarray(term_counts) >= min_count
+                terms = [term for term, keep in zip(terms, kept.tolist()) if keep]
+                term_counts = np.asarray(term_counts)[kept]
+                keep_tokens = False  # token ids would point at dropped terms
+
+            self.terms = list(map(sys.intern, terms))  # equal terms of different texts are the same object
+            self.term_counts = np.asarray(term_counts, dtype=np.int32)
+            self.token_ids = np.asarray(token_ids, dtype=np.int32) if keep_tokens else None
+            self.n_words = n_words
+            self.signature = signature
+            self.sketch = sketch
+            profiler.count('tokens', self.n_words)
+            profiler.count('terms', len(self.terms))
+        self._top = None  # ids of the most frequent terms, found by most_common()
+        self._counts = None  # counts dictionary, built on first request
+
+    @classmethod
+    def from_counts(cls, counts: dict, name='_', signature=None, ngram=1):
+        """
+        Creates TokenedText from already known counts, without any *.txt file (e.g. row of saved Corpus).
+        :param counts: (dict) Tokens (str) as keys and their counts (int) as values.
+        :param name: (str) Identification name of TokenedText
+        :param signature: (ndarray) Known MinHash signature of the text, if any.
+        :param ngram: (int) Number of successive tokens in every term of counts.
+        :return: (TokenedText) with tokens attribute None, as for streamed text.
+        """
+        tok_txt = cls.__new__(cls)
+        tok_txt.name = name
+        terms, term_counts = cls._count_arrays(counts)
+        tok_txt.terms = list(map(sys.intern, terms))
+        tok_txt.term_counts = term_counts
+        tok_txt.token_ids = None
+        tok_txt.n_words = int(term_counts.sum())
+        tok_txt.ngram = ngram
+        tok_txt.signature = signature
+        tok_txt.sketch = None
+        tok_txt._top = None
+        tok_txt._counts = None
+        return tok_txt
+
+    @staticmethod
+    def _sketch_tokens(tokens, sketcher, ngram=1, minhasher=None):
+        """
+        Counts tokens (or their n-grams) approximately, block by block, so only a block of tokens is in memory at once.
+        :param tokens: (iterable) Tokens (str), e.g. generator from stream_tokens().
+        :param sketcher: (Sketcher) Settings of the sketch.
+        :param ngram: (int) Number of successive tokens counted as single term, n-grams spanning blocks included.
+        :param minhasher: (MinHasher) If given, MinHash signature is computed in the same pass.
+        :return sketch: (FrequencySketch) Approximate counts.
+        :return signature: (ndarray) MinHash signature, None if minhasher is not given.
+        """
+        tokens = iter(tokens)
+        sketch = sketcher.sketch()
+        minhash = minhasher.minhash() if minhasher is not None else None
+        carry = []  # last ngram - 1 tokens of previous block
+        for block in iter(lambda: list(islice(tokens, STREAM_BLOCK)), []):
+            if minhash is not None:
+                minhash.update(block)
+            if ngram > 1:
+                window = carry + block
+                carry = window[max(len(window) - ngram + 1, 0):]
+                window_terms, _, window_ids = TokenedText._encode_tokens(window)
+                sketch.update(*ngram_count.count_ngrams(window_terms, window_ids, ngram, min_count=1))
+            else:
+                sketch.update(*TokenedText._count_arrays(Counter(block)))
+        return sketch, (minhash.signature() if minhash is not None else None)
+
+    @staticmethod
+    def _count_arrays(counts):
+        """
+        Converts counts into parallel arrays, in order of counts.
+        :param counts: (dict) Tokens (str) as keys and their counts (int) as values.
+        :return terms: (list) Tokens (str).
+        :return term_counts: (ndarray) Counts (int32) aligned with terms.
+        """
+        return list(counts), np.fromiter(counts.values(), dtype=np.int32, count=len(counts))
+
+    @staticmethod
+    def _encode_tokens(tokens):
+        """
+        Counts tokens and encodes their sequence as ids of unique tokens, in a single pass over the tokens.
+        :param tokens: (list) Tokens (str).
+        :return terms: (list) Unique tokens (str), in order of first occurrence.
+        :return term_counts: (ndarray) Counts (int32) aligned with terms.
+        :return token_ids: (ndarray) Positions of successive tokens within terms (int32).
+        """
+        term_ids = {}
+        token_ids = np.fromiter((term_ids.setdefault(tk, len(term_ids)) for tk in tokens), dtype=np.int32,
+                                count=len(tokens))  # ids in order of first occurrence
+        return list(term_ids), np.bincount(token_ids, minlength=len(term_ids)).astype(np.int32), token_ids
+
+    @property
+    def counts(self):
+        """
+        Tokens (str) as keys and their respective counts (int) as values, in order of terms. Built from terms and
+        term_counts on first request and kept, so repeated lookups (e.g. counts.get(term) in a loop) are cheap - use
+        most_common() for the most frequent tokens.
+        :return: (dict)
+        """
+        if self._counts is None:
+            self._counts = dict(zip(self.terms, self.term_counts.tolist()))
+        return self._counts
+
+    def most_common(self, n=10):
+        """
+        n most frequent tokens within the text, found with partial selection instead of sorting all terms.
+        The result is kept, so asking again for the same or smaller n is free.
+        :param n: (int) Number of tokens.
+        :return: (dict) Tokens (str) as keys and their counts (int) as values, from the most frequent
+            (ties in order of first occurrence).
+        """
+        if self._top is None or (len(self._top) < n and len(self._top) < len(self.terms)):
+            self._top = top_ids(self.term_counts, n)
+        top = self._top[:n]
+        return {self.terms[i]: cnt for i, cnt in zip(top.tolist(), self.term_counts[top].tolist())}
+
+    @property
+    def tokens(self):
+        """
+        List of tokens (str) within the text, decoded from token_ids on every request (O(number of tokens)), so it
+        is better kept in a variable than accessed repeatedly.
+        :return: (list) or None if tokens were not kept.
+        """
+        if self.token_ids is None:
+            return None
+        return [self.terms[i] for i in self.token_ids.tolist()]
 
     def __str__(self):
         """
         String representation for TokenedText class. Returns (str) of occurring terms and their counts in table format.
         :return: (str)
         """
-        max_wrd_len = max(len(wrd) for wrd, _ in self.counts.items())  # longest word, to adjust table size
+        max_wrd_len = max(len(wrd) for wrd in self.terms)  # longest word, to adjust table size
         print_out = ["Id:| Word:   | Count: |"]  # predefining returned list with pieces of string
-        for i, (wrd, cnt) in enumerate(self.counts.items()):
+        for i, (wrd, cnt) in enumerate(self.most_common(len(self.terms)).items()):
             # Appending to return list: id adjusted to left, token adjusted to left, count adjusted to right
             print_out.append(f"{(str(i + 1) + '.').ljust(3)} {wrd.ljust(max_wrd_len)}; {str(cnt).rjust(2)}")
         return "\n".join(print_out)  # Join the list with newline
@@ -67,6 +414,27 @@ class TokenedText:
 
         return content
 
+    @staticmethod
+    def stream_tokens(path: str, chunk_size=STREAM_CHUNK_SIZE, tokenizer='nltk', token_filter=None):
+        """
+        Reads *.txt file in chunks, cleaning and tokenizing them one at a time. Word cut by the end of a chunk is
+        carried over to the next one, so yielded tokens are the same as from tokenizing whole file at once.
+        :param path: (str) Path to *.txt file
+        :param chunk_size: (int) Number of characters read at once.
+        :param tokenizer: (str) Tokenizer backend, one of TOKENIZERS.
+        :param token_filter: (TokenFilter) Stop-words and min length filter. Defaults to default_filter().
+        :return: (generator) of tokens (str)
+        """
+        carry = ''
+        with open(path, 'r', encoding='utf-8') as file:
+            for chunk in iter(lambda: file.read(chunk_size), ''):
+                # Cleaning works char by char, so cleaned chunks glued together are equal to cleaned whole file
+                chunk = carry + TokenedText.clean_char(chunk)
+                cut = _TRAILING_WORD.search(chunk).start()  # last word may continue in the next chunk
+                carry = chunk[cut:]
+                yield from TokenedText.tokenize(chunk[:cut], tokenizer, token_filter)
+        yield from TokenedText.tokenize(carry, tokenizer, token_filter)
+
     @staticmethod
     def clean_char(txt: str):
         """
@@ -74,34 +442,47 @@ class TokenedText:
         :param txt: (str) Raw contents of text file.
         :return: (str) Cleaned contents of text file.
         """
-        txt = re.sub("[^a-zA-Z\s]", "", txt)  # Substitute everything apart from a-z, A-Z and whitespaces with blank
+        txt = re.sub(CLEAN_PATTERN, "", txt)  # Substitute everything apart from a-z, A-Z and whitespaces with blank
         txt = txt.lower()  # Change upper to lower case
         return txt
 
     @staticmethod
-    def tokenize(txt: str):
+    def tokenize(txt: str, tokenizer='nltk', token_filter=None, profiler=None):
         """
         Converts single cleaned string with contents of text file into list of individual words called tokens.
+        Stop-words and too short words are dropped with token_filter, in the same pass.
         :param txt: (str) Cleaned contents of text file.
+        :param tokenizer: (str) 'nltk' uses nltk word_tokenize. 'fast' splits cleaned text on whitespaces and filters
+            it in the same pass - on cleaned text it gives the same tokens as 'nltk', at a fraction of the cost.
+        :param token_filter: (TokenFilter) Stop-words and min length filter. Defaults to default_filter().
+        :param profiler: (Profiler) Records time of 'tokenize' and 'filter' stages. With 'fast' tokenizer filtering is
+            done in the same pass, so it is a part of 'tokenize' stage.
         :return: (list) List of individual words in the file (str)
         """
-        tokens = word_tokenize(txt)  # Utilize nltk word_tokenize
+        token_filter = default_filter() if token_filter is None else token_filter
+        profiler = NULL_PROFILER if profiler is None else profiler
 
-        # Drop common stop words using nltk - this lib has pretty conservative set of stop-words
-        stop_words = set(stopwords.words("english"))
-        tokens = [tk for tk in tokens if tk not in stop_words]
+        if tokenizer == 'fast':
+            # Only letters and whitespaces are left after clean_char(), so word_tokenize reduces to splitting on
+            # whitespaces, apart from few contractions which it splits further.
+            stop_words, min_len, split_words = token_filter.stop_words, token_filter.min_len, token_filter.split_words
+            with profiler.stage('tokenize'):
+                return [tk for wrd in txt.split() if wrd not in stop_words and len(wrd) >= min_len
+                        for tk in split_words.get(wrd, (wrd,))]
 
-        # Drop any words shorter than 3 characters to increase quality of some text transcriptions
-        tokens = [tk for tk in tokens if len(tk) >= 3]
-        return tokens
+        with profiler.stage('tokenize'):
+            tokens = load_nltk('punkt_tab').word_tokenize(txt)  # Utilize nltk word_tokenize
+        with profiler.stage('filter'):
+            return token_filter(tokens)
 
-    def words_count(self):
+    def words_count(self, tokens=None):
         """
-        Count occurrences of individual tokens within TokenedText. Zip them in a dictionary.
+        Count occurrences of individual tokens within TokenedText. Zip them in a dictionary, in order of first
+        occurrence (see most_common() for the most frequent ones).
+        :param tokens: (iterable) Tokens (str) to count, e.g. generator from stream_tokens(). If None, counts of
+            the text itself are returned.
         :return: (dict) Keys are tokens, values are counts.
         """
-        txt_count = Counter(self.tokens)  # Utilizing Counter function from collections
-        sorted_count = {k: v for k, v in sorted(txt_count.items(),
-                                                key=lambda item: item[1],  # Sorting dictionary with respect to count
-                                                reverse=True)}  # Reversing the order, so the highest counts are in front
-        return sorted_count
+        if tokens is None:
+            return self.counts  # text is counted already, when it is created
+        return dict(Counter(tokens))  # Utilizing Counter function from collections